@@ -9,11 +9,15 @@ import os
 import scrapy
 from itemadapter import ItemAdapter
 from scrapy.exceptions import DropItem
-from pathlib import PurePosixPath
 from scrapy.utils.httpobj import urlparse_cached
 from itemadapter import ItemAdapter
 from scrapy.pipelines.files import FilesPipeline
 
+try:
+    from pybloom_live import ScalableBloomFilter
+except ImportError:  # 未安装时退回到普通 set
+    ScalableBloomFilter = None
+
 
 
 class BspPrizePipeline:
@@ -23,7 +27,15 @@ class BspPrizePipeline:
 
 class DuplicatesPipeline:
     def __init__(self):
-        self.ids_seen = set()
+        if ScalableBloomFilter is not None:
+            # 每个 URL 约 10 bit，误判率 1e-6（误判只会跳过个别页面）
+            self.ids_seen = ScalableBloomFilter(
+                initial_capacity=100_000,
+                error_rate=1e-6,
+                mode=ScalableBloomFilter.LARGE_SET_GROWTH,
+            )
+        else:
+            self.ids_seen = set()
 
     def process_item(self, item, spider):
         adapter = ItemAdapter(item)
@@ -34,8 +46,14 @@ class DuplicatesPipeline:
             return item
         
 class MyFilesPipeline(FilesPipeline):
+    def __init__(self, store_uri, download_func=None, settings=None):
+        super().__init__(store_uri, download_func=download_func, settings=settings)
+        self.files_store = store_uri
+        # 目录 -> 已存在文件名集合，每个目录只 listdir 一次
+        self._dir_cache: dict[str, frozenset[str]] = {}
+
     def file_path(self, request, response=None, info=None, *, item=None):
-        return "bsp_item/" + item.get("title")  + "/" + PurePosixPath(urlparse_cached(request).path).name
+        return f"bsp_item/{item.get('title')}/{urlparse_cached(request).path.rpartition('/')[2]}"
     
     def media_failed(self, failure, request, info):
         # Handle the failed download
@@ -50,9 +68,13 @@ class MyFilesPipeline(FilesPipeline):
         if not file_urls:
             return item
 
+        target_dir = self._get_item_dir(item)
+        existing = self._list_dir(target_dir)
+
         for file_url in file_urls:
-            filepath = self._get_file_path_from_url(file_url, item, spider)  # Use helper function
-            if os.path.exists(filepath):
+            filename = file_url.rsplit('/', 1)[-1]
+            if filename in existing:
+                filepath = os.path.join(target_dir, filename)
                 spider.logger.info(f"File already exists: {filepath}. Removing from download list: {file_url}")
                 # Do *not* add this URL to urls_to_download
             else:
@@ -64,17 +86,27 @@ class MyFilesPipeline(FilesPipeline):
 
         #return item  # Return the item to continue the download process
         return super().process_item(item, spider)
-    
-
 
-    def _get_file_path_from_url(self, url, item, spider):
-        """Helper function to construct the file path (mirrors file_path)."""
-        # category = spider.crawler.spider.settings.get('FILES_STORE_CATEGORY', 'default') # get category from settings
-        filename = url.split('/')[-1]
-        files_store = spider.crawler.spider.settings.get('FILES_STORE')
-        if not files_store:
-            raise ValueError("FILES_STORE setting must be defined")
-        return os.path.join(files_store, 'bsp_item', item.get("title"), filename)
+    def item_completed(self, results, item, info):
+        # 有新文件落盘后，目录缓存失效
+        if any(ok for ok, _ in results):
+            self._dir_cache.pop(self._get_item_dir(item), None)
+        return super().item_completed(results, item, info)
+
+    def _get_item_dir(self, item):
+        """Item 对应的本地存储目录 (mirrors file_path)."""
+        return os.path.join(self.files_store, 'bsp_item', item.get("title"))
+
+    def _list_dir(self, target_dir):
+        """返回目录下已存在的文件名集合，结果按目录缓存。"""
+        existing = self._dir_cache.get(target_dir)
+        if existing is None:
+            try:
+                existing = frozenset(os.listdir(target_dir))
+            except FileNotFoundError:
+                existing = frozenset()
+            self._dir_cache[target_dir] = existing
+        return existing
 
     
     def get_media_requests(self, item, info):
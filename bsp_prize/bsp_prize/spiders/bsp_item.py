@@ -4,15 +4,36 @@ import urllib.parse
 import scrapy
 import urllib
 import logging
+from parsel.csstranslator import HTMLTranslator
+
+
+# CSS 选择器在模块加载时一次性转换为 XPath，避免每个 response 重复翻译
+_T = HTMLTranslator()
+_SEL_LINKS = _T.css_to_xpath(".products_item a")
+_SEL_TITLE = _T.css_to_xpath("h1.headLine1::text")
+_SEL_DATE = _T.css_to_xpath(".contents .releaseDate::text")
+_SEL_DESC = _T.css_to_xpath(".productDetail_body  p *::text")
+# 在选择阶段由 lxml 过滤掉 javascript: 链接
+_SEL_GALLERY = _T.css_to_xpath('.productDetail_imgs a:not([href*="javascript"])::attr(href)')
+_SEL_THUMBS = _T.css_to_xpath(".productDetail_imgs img::attr(src)")
+_SEL_PANKUZU = _T.css_to_xpath(".pankuzu_item a")
+_SEL_TEXT = _T.css_to_xpath("::text")
+_SEL_HREF = _T.css_to_xpath("::attr(href)")
 
 
 class BspItemSpider(scrapy.Spider):
     name = 'bsp_item'
     allowed_domains = ['bsp-prize.jp']
-    start_urls = []
+    base_url = 'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/'
+    # 页数，可通过 scrapy crawl bsp_item -a pages=N 覆盖
+    pages = 6
+    custom_settings = {
+        'HTTPCACHE_EXPIRATION_SECS': 86400,
+    }
         
     def start_requests(self):
-        for url in self.start_urls:
+        for page in range(1, int(self.pages) + 1):
+            url = f"{self.base_url}?page={page}" if page > 1 else self.base_url
             yield scrapy.Request(url=url, callback=self.parse)
 
     def parse(self, response):
@@ -24,29 +45,29 @@ class BspItemSpider(scrapy.Spider):
         
         # 提取页面中的价格
         # price = response.xpath('//span[@class="price"]/text()').get()
-        links = response.css(".products_item a")
+        links = response.xpath(_SEL_LINKS)
         logging.info(f"Found {len(links)} link(s) on page {response.url}")
         
         yield from response.follow_all(links, callback=self.parse_detail)
 
     
     def parse_detail(self, response):
-        def extract_with_css(query):
-            return response.css(query).get(default="").strip()
+        def extract_with_xpath(query):
+            return response.xpath(query).get(default="").strip()
         
         description = ""
-        for part in response.css('.productDetail_body  p *::text').getall():  # Iterate through all text and <br>
+        for part in response.xpath(_SEL_DESC).getall():  # Iterate through all text and <br>
             description += part +'\n'
 
         # 输出提取的数据
         data = {
             'url': response.url,
-            'title': extract_with_css("h1.headLine1::text"),
-            'date': extract_with_css(".contents .releaseDate::text"),            
-            'gallery': [i for i in response.css(".productDetail_imgs a::attr(href)").getall() if "javascript" not in i ],
-            'thumbs': response.css(".productDetail_imgs img::attr(src)").getall(),
+            'title': extract_with_xpath(_SEL_TITLE),
+            'date': extract_with_xpath(_SEL_DATE),            
+            'gallery': response.xpath(_SEL_GALLERY).getall(),
+            'thumbs': response.xpath(_SEL_THUMBS).getall(),
             'desc': description,
-            'characters': [i.css("::text").get() for i in response.css('.pankuzu_item a') if ("charac" in i.css("::attr(href)").get())]
+            'characters': [i.xpath(_SEL_TEXT).get() for i in response.xpath(_SEL_PANKUZU) if ("charac" in i.xpath(_SEL_HREF).get())]
         }
 
         # data["file_urls"] = [urllib.parse.urljoin(response.url, i) for i in data["gallery"]]
@@ -59,71 +80,5 @@ class BspItemSpider(scrapy.Spider):
         yield data
 
 
-class BspItemSpider1(BspItemSpider):
-    name = 'bsp_item_1'
-    start_urls = [
-          'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/',
-    ]
-
-class BspItemSpider2(BspItemSpider):
-    name = 'bsp_item_2'
-    start_urls = [
-          'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=2',
-    ]
-
-
-class BspItemSpider3(BspItemSpider):
-    name = 'bsp_item_3'
-    start_urls = [
-          'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=3',
-    ]
-
-
-class BspItemSpider4(BspItemSpider):
-    name = 'bsp_item_4'
-    start_urls = [
-          'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=4',
-    ]
-
-class BspItemSpider5(BspItemSpider):
-    name = 'bsp_item_5'
-    start_urls = [
-          'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=5',
-    ]
-
-class BspItemSpider6(BspItemSpider):
-    name = 'bsp_item_6'
-    start_urls = [
-          'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=6',
-    ]
-
-
 class BspItemSpiderAll(BspItemSpider):
     name = 'bsp_item_all'
-    start_urls = [
-        'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/',
-        'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=2',
-        'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=3',
-        'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=4',
-        'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=5',
-        'https://bsp-prize.jp/brand/5/item-by-title/IP00002025/?page=6',
-    ]
-
-
-class QuotesSpider(scrapy.Spider):
-    name = "quotes"
-
-    def start_requests(self):
-        urls = [
-            "https://quotes.toscrape.com/page/1/",
-            "https://quotes.toscrape.com/page/2/",
-        ]
-        for url in urls:
-            yield scrapy.Request(url=url, callback=self.parse)
-
-    def parse(self, response):
-        page = response.url.split("/")[-2]
-        pass
-        # filename = f"quotes-{page}.html"
-        # Path(filename).write_bytes(response.body)
-        # self.log(f"Saved file {filename}")
@@ -1,69 +1,109 @@
 import cv2
 import numpy as np
+import atexit
 import os
+import queue
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_figures(image_path, output_dir):
+# 后台写图队列：主循环只负责计算，PNG 编码和落盘交给写线程
+_write_queue = None
+
+
+def _writer(q):
+    while True:
+        output_path, image = q.get()
+        try:
+            # imwrite 多数失败只返回 False，少数情况抛 cv2.error；两种都只记录，写线程不能退出，
+            # 否则队列写满后 put() 和 flush_writes() 会永久阻塞
+            if not cv2.imwrite(output_path, image):
+                print(f"Failed to write {output_path}")
+        except Exception as e:
+            print(f"Failed to write {output_path}: {e}")
+        finally:
+            q.task_done()
+
+
+def _get_write_queue():
+    """按进程懒启动写线程，返回写图队列。"""
+    global _write_queue
+    if _write_queue is None:
+        _write_queue = queue.Queue(maxsize=16)
+        threading.Thread(target=_writer, args=(_write_queue,), daemon=True).start()
+        atexit.register(flush_writes)
+    return _write_queue
+
+
+def flush_writes():
+    """等待队列中所有图片写完。"""
+    if _write_queue is not None:
+        _write_queue.join()
+
+
+def extract_figures(image_path, output_dir, scale=2):
     """
-    从白底图中提取人物模型并保存为白底正方形图片，过滤像素面积小于 200 的元素。
+    从白底图中提取人物模型并保存为白底正方形图片，过滤像素面积小于 100*100 的元素。
 
     Args:
         image_path: 图片路径。
         output_dir: 输出文件夹路径。
+        scale: 检测时的缩小倍数，只在缩小图上找元素，再从原图裁剪。
     """
     # 读取图片
     image = cv2.imread(image_path)
+    img_h, img_w = image.shape[:2]
+
+    # 缩小后再检测，灰度/二值化/连通域的计算量按 scale^2 下降
+    small = cv2.resize(image, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA) if scale > 1 else image
 
     # 将图片转换为灰度图
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
 
     # 使用调整后的阈值二值化（阈值230可根据情况调整）
     _, thresh = cv2.threshold(gray, 230, 255, cv2.THRESH_BINARY_INV)
 
-    # 查找轮廓
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    # 遍历轮廓
-    for i, contour in enumerate(contours):
-        # 计算轮廓的面积
-        area = cv2.contourArea(contour)
+    # 连通域分析，一次 C 层扫描同时得到每个元素的像素面积和边界框
+    _, _, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
 
-        # 设置最小轮廓面积阈值
-        min_area = 100*100
+    # 设置最小面积阈值，过滤原图像素面积小于 100*100 的元素（跳过第 0 个背景）
+    min_area = (100 // scale) * (100 // scale)
+    keep = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] >= min_area) + 1
 
-        # 过滤像素面积小于 100*100 的元素
-        if area < min_area:
-            continue
+    filename = os.path.splitext(os.path.basename(image_path))[0]
 
-        # 计算轮廓的边界框
-        x, y, w, h = cv2.boundingRect(contour)
+    for i in keep:
+        # 元素的边界框，换算回原图坐标
+        x, y, w, h = (int(v) * scale for v in stats[i, :4])
+        w = min(w, img_w - x)
+        h = min(h, img_h - y)
 
         # 提取人物模型区域
         figure_image = image[y:y+h, x:x+w]
 
-        # 获取人物模型尺寸
-        height, width, _ = figure_image.shape
-
         # 计算正方形边长
-        size = max(height, width)
-
-        # 创建白色背景图片
-        new_image = np.zeros((size, size, 3), np.uint8)
-        new_image[:] = (255, 255, 255)  # 设置为白色
+        size = max(h, w)
 
-        # 计算粘贴位置
-        x_offset = (size - width) // 2
-        y_offset = (size - height) // 2
-
-        # 将人物模型粘贴到白色背景上
-        new_image[y_offset:y_offset+height, x_offset:x_offset+width] = figure_image
+        # 计算四周留白，一次 C 调用生成白底正方形图片
+        top = (size - h) // 2
+        bottom = size - h - top
+        left = (size - w) // 2
+        right = size - w - left
+        new_image = cv2.copyMakeBorder(figure_image, top, bottom, left, right,
+                                       cv2.BORDER_CONSTANT, value=(255, 255, 255))
 
         # 构建输出路径
-        filename = os.path.splitext(os.path.basename(image_path))[0]
         output_path = os.path.join(output_dir, f"{filename}_figure{i}.png")
 
-        # 保存图片
-        cv2.imwrite(output_path, new_image)
+        # 保存图片（交给后台写线程，调用方需在结束前 flush_writes()）
+        _get_write_queue().put((output_path, new_image))
+
+def _worker(tasks):
+    """ProcessPoolExecutor 入口，处理一组 (image_path, output_dir) 并等待写盘完成。"""
+    for image_path, output_dir in tasks:
+        extract_figures(image_path, output_dir)
+    flush_writes()
+
 
 if __name__ == "__main__":
     input_folder = "../build/input_images/bsp_item"  # 输入文件夹路径
@@ -77,7 +117,8 @@ if __name__ == "__main__":
     # 创建输出文件夹
     os.makedirs(output_folder, exist_ok=True)
 
-    # 遍历输入文件夹及其子文件夹中的所有图片
+    # 遍历输入文件夹及其子文件夹中的所有图片，先收集任务
+    tasks = []
     for root, _, files in os.walk(input_folder):
         for filename in files:
             if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
@@ -86,4 +127,9 @@ if __name__ == "__main__":
                 relative_path = os.path.relpath(root, input_folder)
                 output_subdirectory = os.path.join(output_folder, relative_path)
                 os.makedirs(output_subdirectory, exist_ok=True)
-                extract_figures(image_path, output_subdirectory)
\ No newline at end of file
+                tasks.append((image_path, output_subdirectory))
+
+    # 每张图片互不依赖，按 8 张一组分发到多个进程并行处理
+    chunks = [tasks[i:i + 8] for i in range(0, len(tasks), 8)]
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(_worker, chunks))
@@ -1,9 +1,16 @@
 import os
-from datetime import datetime
-import pymongo
+import asyncio
+import hashlib
+import logging
 from pymongo import UpdateOne
+from pymongo.errors import ClientBulkWriteException
 import sys
-from jump_cal.translators.deepseek_translator import DeepSeekTranslator
+
+# 添加项目路径到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from toy_news.translators.deepseek_translator import DeepSeekTranslator
+from toy_news.pipelines.mongo_pool import get_client
 
 class MongoTranslator:
     def __init__(self, mongo_uri, mongo_db, source_collection, target_collection, translate_all=False):
@@ -12,17 +19,25 @@ class MongoTranslator:
         self.source_collection = source_collection
         self.target_collection = target_collection
         self.translator = DeepSeekTranslator()
+        # 翻译客户端是异步的，复用同一个事件循环以保持 HTTP/2 长连接
+        self.loop = asyncio.new_event_loop()
         self.FIELDS_TO_TRANSLATE = ['title', 'goodsName']
         self.translate_all = translate_all
 
     def connect_mongodb(self):
-        self.client = pymongo.MongoClient(self.mongo_uri)
+        # 进程内共享的连接池，随进程退出关闭
+        self.client = get_client(self.mongo_uri)
         self.db = self.client[self.mongo_db]
         self.source_coll = self.db[self.source_collection]
         self.target_coll = self.db[self.target_collection]
+        # 未翻译查询 {'translatedAt': {'$exists': False}} 走索引的 null 区间，不再全表扫描
+        self.source_coll.create_index('translatedAt')
+        self.translator.enable_disk_cache(os.getenv('DS_TRANS_CACHE_DIR', '/tmp/ds_trans'))
+        self.translator.enable_cache(self.db['translation_cache'])
 
     def close_mongodb(self):
-        self.client.close()
+        self.loop.run_until_complete(self.translator.aclose())
+        self.loop.close()
 
     def process_collection(self):
         try:
@@ -32,82 +47,170 @@ class MongoTranslator:
             # Get all documents if translate_all is True, otherwise get only untranslated
             query = {} if self.translate_all else {'translatedAt': {'$exists': False}}
             
-            # Get total count of documents to process
-            total_docs = self.source_coll.count_documents(query)
-            print(f"Total documents to process: {total_docs}")
+            # 只用元数据估算集合大小做日志，避免对大集合 count_documents 全量扫描
+            print(f"Collection size (estimated): {self.source_coll.estimated_document_count()}")
             
-            # Process documents in batches of 10
-            batch_size = 10
+            # 每批取较多文档，由翻译器按 token 预算打包成少量请求
+            batch_size = 200
             processed_count = 0
+            batch_count = 0
             
-            while processed_count < total_docs:
-                # Get next batch of documents
-                cursor = self.source_coll.find(query).limit(batch_size)
-                
-                docs_to_translate = list(cursor)
-                if not docs_to_translate:
-                    break
-                
-                print(f"\nProcessing batch {processed_count//batch_size + 1} ({len(docs_to_translate)} documents)...")
+            # 单个游标流式读取，每次网络往返取 1000 条，不再每批重新 find().limit()
+            # 只取需要翻译的字段，大字段（图片列表等）不走网络
+            projection = {field: 1 for field in self.FIELDS_TO_TRANSLATE}
+            projection['translatedHash'] = 1
+            projection['translatedAt'] = 1
+            cursor = self.source_coll.find(query, projection, no_cursor_timeout=True).batch_size(1000)
+            try:
+                docs_to_translate = []
+                for doc in cursor:
+                    docs_to_translate.append(doc)
+                    if len(docs_to_translate) >= batch_size:
+                        batch_count += 1
+                        processed_count += self.process_batch(docs_to_translate, batch_count)
+                        docs_to_translate = []
                 
-                try:
-                    # Translate the batch using the DeepSeek translator module
-                    translated_docs = self.translator.batch_translate_documents(
-                        docs_to_translate,
-                        self.FIELDS_TO_TRANSLATE
-                    )
-                    
-                    # Update target collection with only translated fields
-                    bulk_operations = []
-                    for doc in translated_docs:
-                        # Create update with only translated fields that exist
-                        translated_fields = {}
-                        for field in self.FIELDS_TO_TRANSLATE:
-                            translated_field = f'{field}CN'
-                            if translated_field in doc:
-                                translated_fields[translated_field] = doc[translated_field]
-                        
-                        if translated_fields:  # Only add if we have translations
-                            bulk_operations.append(
-                                UpdateOne(
-                                    {'_id': doc['_id']},
-                                    {'$set': {**translated_fields, 'updatedAt': datetime.now()}},
-                                    upsert=True
-                                )
-                            )
-                    
-                    if bulk_operations:
-                        self.target_coll.bulk_write(bulk_operations)
-                        
-                        # Update source collection to mark as translated
-                        source_bulk_operations = []
-                        for doc in translated_docs:
-                            source_bulk_operations.append(
-                                UpdateOne(
-                                    {'_id': doc['_id']},
-                                    {'$set': {'translatedAt': datetime.now()}}
-                                )
-                            )
-                        self.source_coll.bulk_write(source_bulk_operations)
-                    
-                    processed_count += len(translated_docs)
-                    print(f"Successfully processed batch. Total processed: {processed_count}/{total_docs}")
-                    
-                except Exception as e:
-                    print(f"Error processing batch: {str(e)}")
-                    continue
+                if docs_to_translate:
+                    batch_count += 1
+                    processed_count += self.process_batch(docs_to_translate, batch_count)
+            finally:
+                cursor.close()
 
             print("\n=== Processing Complete ===")
             print(f"Total documents processed: {processed_count}")
-            print(f"Remaining documents: {total_docs - processed_count}")
                     
         except Exception as e:
             print(f"Error in process_collection: {str(e)}")
         finally:
             self.close_mongodb()
 
+    @staticmethod
+    def text_hash(text):
+        return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+    def pending_fields(self, doc):
+        """返回原文自上次翻译后有变化的字段 {字段: 原文}，translatedHash 记录上次翻译时的原文摘要"""
+        hashes = doc.get('translatedHash') or {}
+        return {
+            field: doc[field]
+            for field in self.FIELDS_TO_TRANSLATE
+            if doc.get(field) and hashes.get(field) != self.text_hash(doc[field])
+        }
+
+    async def translate_columns(self, columns):
+        """每个字段的文本列并发翻译，返回与 columns 顺序一致的译文列"""
+        return await asyncio.gather(*(
+            self.translator.batch_translate_texts(texts) for _, texts in columns.values()
+        ))
+
+    def process_batch(self, docs, batch_number):
+        """翻译一批文档并写回，返回成功写入的文档数（已翻译或标记为无需翻译）"""
+        print(f"\nProcessing batch {batch_number} ({len(docs)} documents)...")
+        
+        # 按列收集待翻译内容：ids[row] 为文档 _id，columns[field] = (行号列表, 原文列表)，
+        # 之后只按下标访问，不再携带整个文档
+        ids = []
+        # pending_counts[row] 为该行待翻译字段数，全部成功才标记 translatedAt
+        pending_counts = []
+        # 所有待翻译字段都为空的文档，只打上 translatedAt，避免每次运行都被重新取出
+        empty_ids = []
+        columns = {field: ([], []) for field in self.FIELDS_TO_TRANSLATE}
+        for doc in docs:
+            # 跳过原文未变化的字段（--all 重跑时大部分文档无需再请求 API）
+            fields = self.pending_fields(doc)
+            if not fields:
+                if 'translatedAt' not in doc and not any(doc.get(field) for field in self.FIELDS_TO_TRANSLATE):
+                    empty_ids.append(doc['_id'])
+                continue
+            row = len(ids)
+            ids.append(doc['_id'])
+            pending_counts.append(len(fields))
+            for field, text in fields.items():
+                rows, texts = columns[field]
+                rows.append(row)
+                texts.append(text)
+        if not ids and not empty_ids:
+            print(f"Batch {batch_number} already translated, skipping")
+            return 0
+        columns = {field: column for field, column in columns.items() if column[1]}
+        
+        try:
+            # Translate the batch using the DeepSeek translator module
+            results = self.loop.run_until_complete(self.translate_columns(columns)) if columns else []
+            
+            # 每行的译文和原文摘要；译文与原文相同视为翻译失败，该字段留待下次重试
+            target_sets = [{} for _ in ids]
+            source_sets = [{} for _ in ids]
+            for (field, (rows, texts)), translations in zip(columns.items(), results):
+                for row, text, translation in zip(rows, texts, translations):
+                    if translation == text:
+                        continue
+                    # 管道更新中以 $ 开头的字符串会被当作字段路径，译文需用 $literal 包裹
+                    target_sets[row][f'{field}CN'] = {'$literal': translation}
+                    source_sets[row][f'translatedHash.{field}'] = self.text_hash(text)
+            
+            # 目标集合写入译文、源集合标记已翻译，合并成一次跨集合的 client.bulk_write；
+            # 使用管道形式的更新，时间戳由服务端 $$NOW 生成
+            target_ns = f"{self.mongo_db}.{self.target_collection}"
+            source_ns = f"{self.mongo_db}.{self.source_collection}"
+            models = []
+            # model_ids[i] 为 models[i] 所属文档，用于按写入错误扣除失败的文档
+            model_ids = []
+            for _id, pending_count, target_set, source_set in zip(ids, pending_counts, target_sets, source_sets):
+                if not target_set:  # Only add if we have translations
+                    continue
+                # 有字段翻译失败时只记录成功字段的 translatedHash，不打 translatedAt，
+                # 默认运行（只取无 translatedAt 的文档）下次会重新取出并只重试失败字段
+                if len(source_set) == pending_count:
+                    source_update = {'translatedAt': '$$NOW', **source_set}
+                else:
+                    source_update = source_set
+                model_ids += [_id, _id]
+                models.append(
+                    UpdateOne(
+                        {'_id': _id},
+                        [{'$set': {**target_set, 'updatedAt': '$$NOW'}}],
+                        upsert=True,
+                        namespace=target_ns
+                    )
+                )
+                # Update source collection to mark as translated
+                models.append(
+                    UpdateOne(
+                        {'_id': _id},
+                        [{'$set': source_update}],
+                        namespace=source_ns
+                    )
+                )
+            for _id in empty_ids:
+                model_ids.append(_id)
+                models.append(
+                    UpdateOne({'_id': _id}, [{'$set': {'translatedAt': '$$NOW'}}], namespace=source_ns)
+                )
+            
+            failed = set()
+            if models:
+                try:
+                    # 无序写入：服务端可并行执行，单条失败不影响同批其他文档
+                    self.client.bulk_write(models, ordered=False)
+                except ClientBulkWriteException as e:
+                    for error in e.write_errors or []:
+                        print(f"Write error at op {error.get('idx')}: {error.get('errmsg')}")
+                        if error.get('idx') is not None:
+                            failed.add(model_ids[error['idx']])
+            
+            print(f"Successfully processed batch {batch_number}")
+            return len(set(model_ids) - failed)
+            
+        except Exception as e:
+            print(f"Error processing batch: {str(e)}")
+            return 0
+
 
 def main():
+    # 翻译器内部日志，DS_TRANS_LOG=DEBUG 可查看每个请求的细节
+    logging.basicConfig(level=os.getenv('DS_TRANS_LOG', 'INFO'))
+
     # Simple flag check for --all
     translate_all = len(sys.argv) > 1 and sys.argv[1] == '--all'
 
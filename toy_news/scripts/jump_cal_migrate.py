@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+JumpCal 集合的一次性迁移
+
+设置 createdAt/updatedAt 的 validator，为旧文档补齐 _key 并创建 _key 唯一索引，
+成功后删除被 _key 取代的 goodsName 唯一索引，每次 upsert 只需维护一个唯一索引。
+这些是集合级别的配置，不需要每次启动爬虫都执行，集合新建或 schema 变更时运行一次即可。
+"""
+
+import os
+import sys
+import argparse
+import pymongo
+from pymongo import UpdateOne
+
+# 添加项目路径到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from toy_news.pipelines.jump_cal import goods_key
+
+
+VALIDATOR = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["createdAt", "updatedAt"],  # Enforce these fields
+        "properties": {
+            "createdAt": {
+                "bsonType": "date",
+                "description": "must be a date and is required"
+            },
+            "updatedAt": {
+                "bsonType": "date",
+                "description": "must be a date and is required"
+            }
+        }
+    }
+}
+
+
+def migrate(db, collection_name):
+    if collection_name not in db.list_collection_names():
+        db.create_collection(collection_name, validator=VALIDATOR)
+        print(f"Created collection {collection_name} with validator")
+    else:
+        # Update existing collection's validator
+        db.command({
+            "collMod": collection_name,
+            "validator": VALIDATOR
+        })
+        print(f"Updated validator of {collection_name}")
+
+    collection = db[collection_name]
+    backfill = [
+        UpdateOne({"_id": doc["_id"]}, {"$set": {"_key": goods_key(doc["goodsName"])}})
+        for doc in collection.find({"_key": {"$exists": False}, "goodsName": {"$type": "string"}}, {"goodsName": 1})
+    ]
+    if backfill:
+        collection.bulk_write(backfill, ordered=False)
+        print(f"Backfilled _key for {len(backfill)} documents in {collection_name}")
+
+    collection.create_index("_key", unique=True, sparse=True)
+    print(f"Ensured unique index on {collection_name}._key")
+
+    # _key 已补齐且唯一索引建成，goodsName 唯一索引不再作为 upsert 条件
+    if "goodsName_1" in collection.index_information():
+        collection.drop_index("goodsName_1")
+        print(f"Dropped index {collection_name}.goodsName_1")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JumpCal collection migration')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/',
+                       help='MongoDB URI (default: mongodb://localhost:27017/)')
+    parser.add_argument('--mongo-db', default='scrapy_items',
+                       help='MongoDB database (default: scrapy_items)')
+    parser.add_argument('collections', nargs='*', default=['jump_cal'],
+                       help='Collections to migrate (default: jump_cal)')
+
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(args.mongo_uri)
+    try:
+        db = client[args.mongo_db]
+        for collection_name in args.collections:
+            migrate(db, collection_name)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -68,8 +68,9 @@ def show_statistics(db, collection_name):
     main_col = db[collection_name]
     history_col = db[f"{collection_name}_history"]
     
-    total_items = main_col.count_documents({})
-    total_history = history_col.count_documents({})
+    # Totals come from collection metadata instead of full counts
+    total_items = main_col.estimated_document_count()
+    total_history = history_col.estimated_document_count()
     
     print(f"\n{'='*80}")
     print(f"Statistics for: {collection_name}")
@@ -81,24 +82,40 @@ def show_statistics(db, collection_name):
         avg_versions = total_history / total_items
         print(f"Average versions per item: {avg_versions:.2f}")
     
-    # Items with changes
+    # All groupings in one round trip over the history collection
     pipeline = [
-        {"$group": {"_id": "$product_id", "count": {"$sum": 1}}},
-        {"$match": {"count": {"$gt": 1}}},
-        {"$count": "items_with_changes"}
+        {"$facet": {
+            # Items with changes
+            "items_with_changes": [
+                {"$group": {"_id": "$product_id", "count": {"$sum": 1}}},
+                {"$match": {"count": {"$gt": 1}}},
+                {"$count": "items_with_changes"}
+            ],
+            # Most changed items
+            "top_items": [
+                {"$group": {"_id": "$url", "versions": {"$sum": 1}}},
+                {"$sort": {"versions": -1}},
+                {"$limit": 10}
+            ],
+            # Field change frequency
+            "field_stats": [
+                {"$project": {"changes": {"$objectToArray": "$changes"}}},
+                {"$unwind": "$changes"},
+                {"$group": {"_id": "$changes.k", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+                {"$limit": 10}
+            ]
+        }}
     ]
-    result = list(history_col.aggregate(pipeline))
+    facets = next(history_col.aggregate(pipeline))
+    
+    result = facets['items_with_changes']
     items_with_changes = result[0]['items_with_changes'] if result else 0
     print(f"Items with changes: {items_with_changes}")
     
     # Most changed items
     print("\n\nTop 10 Most Changed Items:")
-    pipeline = [
-        {"$group": {"_id": "$url", "versions": {"$sum": 1}}},
-        {"$sort": {"versions": -1}},
-        {"$limit": 10}
-    ]
-    top_items = list(history_col.aggregate(pipeline))
+    top_items = facets['top_items']
     
     if top_items:
         table_data = [[item['_id'][:60], item['versions']] for item in top_items]
@@ -106,14 +123,7 @@ def show_statistics(db, collection_name):
     
     # Field change frequency
     print("\n\nMost Frequently Changed Fields:")
-    pipeline = [
-        {"$project": {"changes": {"$objectToArray": "$changes"}}},
-        {"$unwind": "$changes"},
-        {"$group": {"_id": "$changes.k", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 10}
-    ]
-    field_stats = list(history_col.aggregate(pipeline))
+    field_stats = facets['field_stats']
     
     if field_stats:
         table_data = [
@@ -154,6 +164,12 @@ def list_recent(db, collection_name, limit=10, days=7):
                    headers=["Timestamp", "URL", "Ver", "Changes", "Spider"], 
                    tablefmt="grid"))
 
+def _preview(value, width=40):
+    """Truncated cell text; strings are sliced directly instead of copied through str()"""
+    if isinstance(value, str):
+        return value[:width]
+    return str(value)[:width]
+
 def compare_versions(db, collection_name, url, v1, v2):
     """Compare two versions"""
     history_col = db[f"{collection_name}_history"]
@@ -176,25 +192,19 @@ def compare_versions(db, collection_name, url, v1, v2):
     snap1 = version1.get('snapshot', {})
     snap2 = version2.get('snapshot', {})
     
-    all_keys = set(snap1.keys()) | set(snap2.keys())
     exclude = {'_id', 'createdAt', 'updatedAt', 'version'}
-    all_keys = all_keys - exclude
+    all_keys = (snap1.keys() | snap2.keys()) - exclude
     
     table_data = []
     for key in sorted(all_keys):
         val1 = snap1.get(key, 'N/A')
         val2 = snap2.get(key, 'N/A')
         
-        if val1 != val2:
-            status = "CHANGED"
-            val1_str = str(val1)[:40]
-            val2_str = str(val2)[:40]
+        # Unchanged rows only need the left value rendered
+        if val1 == val2:
+            table_data.append([key, _preview(val1), "-", "Same"])
         else:
-            status = "Same"
-            val1_str = str(val1)[:40]
-            val2_str = "-"
-        
-        table_data.append([key, val1_str, val2_str, status])
+            table_data.append([key, _preview(val1), _preview(val2), "CHANGED"])
     
     print(tabulate(table_data, 
                    headers=["Field", f"Version {v1}", f"Version {v2}", "Status"],
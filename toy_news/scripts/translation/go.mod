@@ -2,7 +2,10 @@ module translation-service
 
 go 1.21
 
-require go.mongodb.org/mongo-driver v1.13.1
+require (
+	go.mongodb.org/mongo-driver v1.13.1
+	golang.org/x/crypto v0.0.0-20220622213112-05595931fe9d
+)
 
 require (
 	github.com/golang/snappy v0.0.1 // indirect
@@ -12,7 +15,6 @@ require (
 	github.com/xdg-go/scram v1.1.2 // indirect
 	github.com/xdg-go/stringprep v1.0.4 // indirect
 	github.com/youmark/pkcs8 v0.0.0-20181117223130-1be2e3e5546d // indirect
-	golang.org/x/crypto v0.0.0-20220622213112-05595931fe9d // indirect
 	golang.org/x/sync v0.0.0-20220722155255-886fb9371eb4 // indirect
 	golang.org/x/text v0.7.0 // indirect
 )
@@ -3,7 +3,6 @@ package main
 import (
 	"bytes"
 	"context"
-	"crypto/md5"
 	"encoding/hex"
 	"encoding/json"
 	"flag"
@@ -23,6 +22,7 @@ import (
 	"go.mongodb.org/mongo-driver/bson/primitive"
 	"go.mongodb.org/mongo-driver/mongo"
 	"go.mongodb.org/mongo-driver/mongo/options"
+	"golang.org/x/crypto/blake2b"
 )
 
 // TranslationService represents the main translation service
@@ -345,10 +345,11 @@ func (ts *TranslationService) CloseMongoDB(ctx context.Context) error {
 	return nil
 }
 
-// GetTextHash generates MD5 hash of text
+// GetTextHash generates a 128-bit BLAKE2b hash of text (matches Python's blake2b(digest_size=16))
 func (ts *TranslationService) GetTextHash(text string) string {
-	hash := md5.Sum([]byte(text))
-	return hex.EncodeToString(hash[:])
+	hash, _ := blake2b.New(16, nil)
+	hash.Write([]byte(text))
+	return hex.EncodeToString(hash.Sum(nil))
 }
 
 // GetCachedTranslation retrieves translation from cache
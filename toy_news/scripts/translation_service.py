@@ -8,35 +8,59 @@
 
 import os
 import sys
-import time
+import asyncio
+import logging
 import signal
 import argparse
 import hashlib
-from datetime import datetime
-import pymongo
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 
 # 添加项目路径到 Python 路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from toy_news.translators.deepseek_translator import DeepSeekTranslator
+from toy_news.pipelines.mongo_pool import get_async_client
 
 
 class TranslationService:
-    def __init__(self, mongo_uri, mongo_db, mongo_collection, check_interval=10):
+    # 进程内 LRU 缓存的条目数上限
+    MEMO_SIZE = 50000
+
+    def __init__(self, mongo_uri, mongo_db, mongo_collection, check_interval=10, concurrency=4):
         self.mongo_uri = mongo_uri
         self.mongo_db = mongo_db
         self.mongo_collection = mongo_collection
         self.check_interval = check_interval
         self.translator = DeepSeekTranslator()
         self.batch_size = 10
+        # 同时在途的批次数，各自认领不同的待翻译项，翻译请求和 MongoDB 读写相互重叠
+        self.concurrency = concurrency
+        # 统计信息包含全表计数，每处理 stats_every 个批次才输出一次
+        self.stats_every = 60
+        self._cycles = 0
         self.running = True
+        # pending 集合有新插入时置位，空闲的 worker 在此等待而不是轮询
+        self.pending_event = asyncio.Event()
+        # 单批内的文本哈希缓存，查缓存和写缓存共用，每批开始时清空
+        self._hash_memo = {}
+        # text_hash -> 译文 的进程内 LRU，热点文本不必每批都查 MongoDB
+        self._translation_memo = OrderedDict()
         
         # 统一的翻译字段
         self.fields_to_translate = ['name', 'description']
+        # (源字段, 译文字段) 对，避免在热路径里反复拼接 f'{field}CN'
+        self.field_specs = [(field, f'{field}CN') for field in self.fields_to_translate]
+        self.pending_projection = {'product_hash': 1, **{field: 1 for field in self.fields_to_translate}}
+        # 认领超过该时长仍未删除的待翻译项视为 worker 已崩溃，释放给其他 worker
+        self.claim_timeout = timedelta(minutes=10)
         
-    def connect_mongodb(self):
-        self.client = pymongo.MongoClient(self.mongo_uri)
+    async def connect_mongodb(self):
+        # 进程内共享的 motor 连接池，随进程退出关闭
+        self.client = get_async_client(self.mongo_uri)
         self.db = self.client[self.mongo_db]
         
         # 统一的集合
@@ -45,139 +69,215 @@ class TranslationService:
         self.cache_collection = self.db['toys_translation_cache']
         
         # 创建缓存索引 (只需要哈希索引，不需要文本索引)
-        self.cache_collection.create_index('text_hash', unique=True)
+        await self.cache_collection.create_index('text_hash', unique=True)
+        # toys_normalized 的回写按 product_hash 匹配，服务可能先于爬虫 pipeline 启动
+        await self.normalized_collection.create_index('product_hash', unique=True)
+        # 只索引已有译文的文档，show_stats 的 $or 计数可以按分支走索引
+        for _, translated_field in self.field_specs:
+            await self.normalized_collection.create_index(
+                translated_field,
+                partialFilterExpression={translated_field: {'$exists': True}}
+            )
+        # 认领查询按 (claim_id 不存在, createdAt 升序) 取最早的未认领项
+        await self.pending_collection.create_index([('claim_id', 1), ('createdAt', 1)])
         
-    def close_mongodb(self):
-        if hasattr(self, 'client'):
-            self.client.close()
+    async def close_mongodb(self):
+        await self.translator.aclose()
             
     def signal_handler(self, signum, frame):
         """处理停止信号"""
         print(f"\nReceived signal {signum}, shutting down gracefully...")
         self.running = False
+        self.pending_event.set()
         
     def get_text_hash(self, text):
-        """生成文本的哈希值"""
-        return hashlib.md5(text.encode('utf-8')).hexdigest()
+        """生成文本的哈希值
+
+        哈希只作缓存键，用 blake2b-128 代替 md5（更快，长度相同）。
+        切换后旧的 md5 键不再命中，会在下次翻译时按新键重新写入，
+        残留的旧条目可按 updated_at 清理。Go 版服务使用同样的算法。
+        """
+        text_hash = self._hash_memo.get(text)
+        if text_hash is None:
+            text_hash = self._hash_memo[text] = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+        return text_hash
         
-    def get_cached_translation(self, text):
-        """从缓存中获取翻译"""
-        text_hash = self.get_text_hash(text)
-        cached = self.cache_collection.find_one({'text_hash': text_hash})
-        return cached['translated_text'] if cached else None
+    def _remember(self, text_hash, translated_text):
+        """写入进程内 LRU，超出上限时淘汰最久未用的条目"""
+        self._translation_memo[text_hash] = translated_text
+        self._translation_memo.move_to_end(text_hash)
+        if len(self._translation_memo) > self.MEMO_SIZE:
+            self._translation_memo.popitem(last=False)
         
-    def cache_translation(self, original_text, translated_text):
-        """缓存翻译结果"""
+    async def get_cached_translations(self, text_hashes):
+        """先查进程内 LRU，其余一次 $in 查询批量获取，返回 {text_hash: translated_text}"""
+        found = {}
+        missing = []
+        for text_hash in text_hashes:
+            try:
+                self._translation_memo.move_to_end(text_hash)
+                found[text_hash] = self._translation_memo[text_hash]
+            except KeyError:
+                missing.append(text_hash)
+        if not missing:
+            return found
+        cursor = self.cache_collection.find(
+            {'text_hash': {'$in': missing}},
+            {'text_hash': 1, 'translated_text': 1, '_id': 0}
+        )
+        async for cached in cursor:
+            found[cached['text_hash']] = cached['translated_text']
+            self._remember(cached['text_hash'], cached['translated_text'])
+        return found
+        
+    def cache_translation(self, original_text, translated_text, now):
+        """构造缓存翻译结果的 upsert 操作，由调用方批量写入"""
         text_hash = self.get_text_hash(original_text)
-        try:
-            self.cache_collection.update_one(
-                {'text_hash': text_hash},
-                {   
-                    '$setOnInsert': {'created_at': datetime.now()},
-                    '$set': {
-                        'text_hash': text_hash,
-                        'original_text': original_text,
-                        'translated_text': translated_text,
-                        'updated_at': datetime.now(),
-                        'usage_count': 1
-                    }
+        self._remember(text_hash, translated_text)
+        return UpdateOne(
+            {'text_hash': text_hash},
+            {
+                '$setOnInsert': {'created_at': now},
+                '$set': {
+                    'original_text': original_text,
+                    'translated_text': translated_text,
+                    'updated_at': now
                 },
-                upsert=True
-            )
-        except pymongo.errors.DuplicateKeyError:
-            # 如果已存在，增加使用次数
-            self.cache_collection.update_one(
-                {'text_hash': text_hash},
-                {
-                    '$inc': {'usage_count': 1},
-                    '$set': {'updated_at': datetime.now()}
-                }
-            )
+                '$inc': {'usage_count': 1}
+            },
+            upsert=True
+        )
     
-    def translate_with_cache(self, items_to_translate):
+    async def translate_with_cache(self, items_to_translate):
         """使用缓存进行翻译"""
         # 准备翻译数据
-        translation_map = {}  # {field: {original_text: product_hash_list}}
+        misses = {}  # {(field, original_text): doc_index_list}，平铺结构，相同文本只翻译一次
         cache_hits = 0
         cache_misses = 0
+        self._hash_memo.clear()
         
-        # 检查缓存
+        # 先收集整批文本的哈希，一次查询取回所有缓存命中
+        text_hashes = {}
         for doc in items_to_translate:
-            product_hash = doc['product_hash']
-            
             for field in self.fields_to_translate:
+                if field in doc and doc[field]:
+                    text_hashes[doc[field]] = self.get_text_hash(doc[field])
+        cache = await self.get_cached_translations(set(text_hashes.values()))
+        
+        # 检查缓存
+        for index, doc in enumerate(items_to_translate):
+            for field, translated_field in self.field_specs:
                 if field in doc and doc[field]:
                     original_text = doc[field]
-                    cached_translation = self.get_cached_translation(original_text)
+                    cached_translation = cache.get(text_hashes[original_text])
                     
                     if cached_translation:
                         # 缓存命中，直接设置翻译
-                        doc[f'{field}CN'] = cached_translation
+                        doc[translated_field] = cached_translation
                         cache_hits += 1
                     else:
                         # 缓存未命中，需要翻译
-                        if field not in translation_map:
-                            translation_map[field] = {}
-                        if original_text not in translation_map[field]:
-                            translation_map[field][original_text] = []
-                        translation_map[field][original_text].append(product_hash)
+                        misses.setdefault((field, original_text), []).append(index)
                         cache_misses += 1
         
         print(f"Cache hits: {cache_hits}, Cache misses: {cache_misses}")
         
-        # 对缓存未命中的内容进行翻译
-        for field, text_map in translation_map.items():
-            if not text_map:
-                continue
-                
-            # 准备批量翻译的文本
-            texts_to_translate = list(text_map.keys())
-            print(f"Translating {len(texts_to_translate)} unique {field} texts...")
-            
-            # 创建临时文档进行翻译
-            temp_docs = [{field: text} for text in texts_to_translate]
-            translated_docs = self.translator.batch_translate_documents(temp_docs, [field])
+        # 缓存写入攒到整批翻译结束后一次 bulk_write，整批共用一个 UTC 时间戳
+        cache_operations = []
+        now = datetime.now(timezone.utc)
+        
+        # 对缓存未命中的内容进行翻译，一次调用，翻译器内部按字段分组并发请求
+        if misses:
+            print(f"Translating {len(misses)} unique texts...")
+            translated_docs = await self.translator.batch_translate_documents(
+                [{field: text} for field, text in misses], self.fields_to_translate
+            )
+            translated_names = dict(self.field_specs)
             
-            # 处理翻译结果
-            for j, translated_doc in enumerate(translated_docs):
-                original_text = texts_to_translate[j]
-                translated_field = f'{field}CN'
-                
+            # 处理翻译结果，translated_docs 与 misses 的键一一对应
+            for ((field, original_text), indices), translated_doc in zip(misses.items(), translated_docs):
+                translated_field = translated_names[field]
                 if translated_field in translated_doc:
                     translated_text = translated_doc[translated_field]
                     
                     # 缓存翻译结果
-                    self.cache_translation(original_text, translated_text)
+                    cache_operations.append(self.cache_translation(original_text, translated_text, now))
                     
-                    # 更新所有使用这个文本的文档
-                    for product_hash in text_map[original_text]:
-                        # 找到对应的文档并设置翻译
-                        for doc in items_to_translate:
-                            if doc['product_hash'] == product_hash:
-                                doc[translated_field] = translated_text
-                                break
+                    # 按下标更新所有使用这个文本的文档
+                    for index in indices:
+                        items_to_translate[index][translated_field] = translated_text
+        
+        if cache_operations:
+            try:
+                await self.cache_collection.bulk_write(cache_operations, ordered=False)
+            except BulkWriteError as e:
+                # 缓存写失败不影响本批翻译结果
+                print(f"Failed to cache {len(e.details['writeErrors'])} translations")
         
         return items_to_translate
         
-    def process_pending_translations(self):
+    async def claim_pending_items(self):
+        """
+        认领一批待翻译项，多个 worker 并行时互不重复翻译
+
+        先按 createdAt 取最早的一批未认领项，再用带 claim_id 不存在条件的
+        update_many 打上本次 claim_id，单文档更新是原子的，并发 worker 之间
+        每个文档只会被一个 claim_id 认领成功。与其他 worker 竞争时只抢到部分
+        或全部落空，就继续认领后面的未认领项，直到凑满一批或队列确实为空。
+        每轮都全部抢到时直接使用读到的文档，只有发生过竞争才按 claim_id 重新读取。
+        超时未完成的认领先被释放。
+        """
+        # claimed_at 要在多个 worker 之间比较，统一用 UTC
+        now = datetime.now(timezone.utc)
+        await self.pending_collection.update_many(
+            {'claimed_at': {'$lt': now - self.claim_timeout}},
+            {'$unset': {'claim_id': '', 'claimed_at': ''}}
+        )
+        
+        claim_id = uuid.uuid4().hex
+        claimed = 0
+        docs = []
+        raced = False
+        while claimed < self.batch_size:
+            candidates = await (
+                self.pending_collection.find({'claim_id': {'$exists': False}}, self.pending_projection)
+                .sort('createdAt', 1)
+                .limit(self.batch_size - claimed)
+                .to_list(length=None)
+            )
+            if not candidates:
+                break
+            result = await self.pending_collection.update_many(
+                {'_id': {'$in': [doc['_id'] for doc in candidates]}, 'claim_id': {'$exists': False}},
+                {'$set': {'claim_id': claim_id, 'claimed_at': now}}
+            )
+            claimed += result.modified_count
+            if result.modified_count == len(candidates):
+                docs.extend(candidates)
+            else:
+                raced = True
+        
+        if not claimed:
+            return None, []
+        if not raced:
+            return claim_id, docs
+        cursor = self.pending_collection.find({'claim_id': claim_id}, self.pending_projection)
+        return claim_id, await cursor.to_list(length=None)
+        
+    async def process_pending_translations(self):
         """处理待翻译队列"""
+        claim_id = None
         try:
-            # 检查待翻译队列
-            pending_count = self.pending_collection.count_documents({})
-            if pending_count == 0:
-                return 0
-                
-            print(f"Found {pending_count} pending items")
-            
-            # 获取一批待翻译的 items
-            pending_items = list(self.pending_collection.find().sort('createdAt', 1).limit(self.batch_size))
+            # 认领一批待翻译的 items，只取 product_hash 和待翻译字段
+            # 认领查询本身就能判断队列是否为空，不再单独 count_documents
+            claim_id, pending_items = await self.claim_pending_items()
             if not pending_items:
                 return 0
                 
             print(f"Processing {len(pending_items)} items with cache...")
             
             # 使用缓存进行翻译
-            translated_docs = self.translate_with_cache(pending_items)
+            translated_docs = await self.translate_with_cache(pending_items)
             
             # 准备批量操作
             update_operations = []
@@ -187,16 +287,13 @@ class TranslationService:
                 product_hash = doc['product_hash']
                 
                 # 准备翻译字段更新
-                translation_updates = {}
-                has_translation = False
-                
-                for field in self.fields_to_translate:
-                    translated_field = f'{field}CN'
-                    if translated_field in doc:
-                        translation_updates[translated_field] = doc[translated_field]
-                        has_translation = True
+                translation_updates = {
+                    translated_field: doc[translated_field]
+                    for _, translated_field in self.field_specs
+                    if translated_field in doc
+                }
                 
-                if has_translation:
+                if translation_updates:
                     # 更新 toys_normalized 集合
                     update_operations.append(
                         UpdateOne(
@@ -209,48 +306,66 @@ class TranslationService:
                     )
                     
                     # 标记为需要从 pending 中删除
-                    pending_deletions.append(product_hash)
+                    pending_deletions.append(doc)
             
-            # 执行批量操作
+            # 执行批量操作，无序写入，单条失败不影响其余更新
             if update_operations:
-                result = self.normalized_collection.bulk_write(update_operations)
-                print(f"Updated {result.modified_count} products in toys_normalized")
+                try:
+                    result = await self.normalized_collection.bulk_write(update_operations, ordered=False)
+                    print(f"Updated {result.modified_count} products in toys_normalized")
+                except BulkWriteError as e:
+                    write_errors = e.details['writeErrors']
+                    print(f"Updated {e.details['nModified']} products in toys_normalized, {len(write_errors)} failed")
+                    for error in write_errors:
+                        print(f"  {pending_deletions[error['index']]['product_hash']}: {error['errmsg']}")
+                    # 写入失败的项目保留在 pending 中，释放后重新认领
+                    failed = {error['index'] for error in write_errors}
+                    pending_deletions = [doc for i, doc in enumerate(pending_deletions) if i not in failed]
                 
-            # 从 pending 表中删除已处理的项目
+            # 从 pending 表中按 _id 删除已处理的项目，只删除本 worker 认领的
             if pending_deletions:
-                delete_result = self.pending_collection.delete_many({'product_hash': {'$in': pending_deletions}})
+                delete_result = await self.pending_collection.delete_many({
+                    '_id': {'$in': [doc['_id'] for doc in pending_deletions]},
+                    'claim_id': claim_id
+                })
                 print(f"Removed {delete_result.deleted_count} items from translation_pending")
-                
+            
             return len(pending_deletions)
             
         except Exception as e:
             print(f"Error processing pending translations: {str(e)}")
             return 0
+        finally:
+            # 没有翻译结果或处理出错的项目立即释放，下一轮重新认领，不必等认领超时
+            if claim_id is not None:
+                try:
+                    await self.pending_collection.update_many(
+                        {'claim_id': claim_id},
+                        {'$unset': {'claim_id': '', 'claimed_at': ''}}
+                    )
+                except PyMongoError as e:
+                    print(f"Failed to release claim {claim_id}: {e}")
     
-    def show_stats(self):
+    async def show_stats(self):
         """显示统计信息"""
         try:
             # 待翻译队列统计
-            pending_count = self.pending_collection.count_documents({})
+            pending_count = await self.pending_collection.estimated_document_count()
             print(f"Translation pending: {pending_count} items")
             
             # 已翻译产品统计
-            translated_count = self.normalized_collection.count_documents({
-                '$or': [
-                    {'nameCN': {'$exists': True}},
-                    {'descriptionCN': {'$exists': True}}
-                ]
+            translated_count = await self.normalized_collection.count_documents({
+                '$or': [{translated_field: {'$exists': True}} for _, translated_field in self.field_specs]
             })
-            total_products = self.normalized_collection.count_documents({})
+            total_products = await self.normalized_collection.estimated_document_count()
             print(f"Translated products: {translated_count}/{total_products}")
             
             # 缓存统计
-            total_cached = self.cache_collection.count_documents({})
+            total_cached = await self.cache_collection.estimated_document_count()
             if total_cached > 0:
-                total_usage = self.cache_collection.aggregate([
+                total_usage = await self.cache_collection.aggregate([
                     {'$group': {'_id': None, 'total_usage': {'$sum': '$usage_count'}}}
-                ])
-                total_usage = list(total_usage)
+                ]).to_list(length=None)
                 usage_count = total_usage[0]['total_usage'] if total_usage else total_cached
                 
                 print(f"Translation cache: {total_cached} entries, {usage_count} total uses")
@@ -258,77 +373,115 @@ class TranslationService:
         except Exception as e:
             print(f"Error getting stats: {str(e)}")
     
-    def run(self):
+    async def watch_pending(self):
+        """
+        监听 pending 集合的插入并唤醒 worker
+
+        change stream 需要副本集，不可用时直接返回，worker 退回按
+        check_interval 超时轮询。
+        """
+        try:
+            async with self.pending_collection.watch([{'$match': {'operationType': 'insert'}}]) as stream:
+                async for _ in stream:
+                    self.pending_event.set()
+        except PyMongoError as e:
+            print(f"Change stream unavailable, polling every {self.check_interval}s: {e}")
+    
+    async def worker(self):
+        """单个处理循环：认领、翻译、写回，队列为空时等待新插入"""
+        while self.running:
+            # 先清除再认领，认领之后到达的插入会让下面的等待立即返回
+            self.pending_event.clear()
+            processed = await self.process_pending_translations()
+            
+            if processed > 0:
+                print(f"Processed {processed} items in this cycle")
+                # 定期显示更新后的统计
+                self._cycles += 1
+                if self._cycles % self.stats_every == 0:
+                    await self.show_stats()
+                # 队列可能还有积压，继续认领
+                continue
+            
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] No pending translations found")
+            
+            # 等待新插入，超时后兜底再检查一次
+            try:
+                await asyncio.wait_for(self.pending_event.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def run(self):
         """运行翻译服务"""
         print("Starting Unified Translation Service...")
         print("Processing translations for toys_normalized collection")
         print(f"Check interval: {self.check_interval} seconds")
         print(f"Batch size: {self.batch_size}")
+        print(f"Concurrency: {self.concurrency}")
         print(f"Fields to translate: {self.fields_to_translate}")
         print()
         
         # 注册信号处理器
-        signal.signal(signal.SIGINT, self.signal_handler)
-        signal.signal(signal.SIGTERM, self.signal_handler)
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.signal_handler, signum, None)
         
         try:
-            self.connect_mongodb()
+            await self.connect_mongodb()
             
             # 显示初始统计
-            self.show_stats()
+            await self.show_stats()
             print()
             
-            while self.running:
-                processed = self.process_pending_translations()
-                
-                if processed > 0:
-                    print(f"Processed {processed} items in this cycle")
-                    # 显示更新后的统计
-                    self.show_stats()
-                else:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] No pending translations found")
-                
-                # 等待下一次检查
-                for _ in range(self.check_interval):
-                    if not self.running:
-                        break
-                    time.sleep(1)
+            watcher = asyncio.create_task(self.watch_pending())
+            try:
+                await asyncio.gather(*(self.worker() for _ in range(self.concurrency)))
+            finally:
+                watcher.cancel()
                     
         except Exception as e:
             print(f"Service error: {str(e)}")
         finally:
             print("Shutting down Translation Service...")
-            self.close_mongodb()
+            await self.close_mongodb()
+
+    async def run_show_stats(self):
+        """只显示统计信息"""
+        await self.connect_mongodb()
+        await self.show_stats()
+        await self.close_mongodb()
 
 
 def main():
     parser = argparse.ArgumentParser(description='Unified Translation Service')
     parser.add_argument('--interval', '-i', type=int, default=10,
-                       help='Check interval in seconds (default: 10)')
+                       help='Fallback check interval in seconds when idle (default: 10)')
     parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/',
                        help='MongoDB URI (default: mongodb://localhost:27017/)')
     parser.add_argument('--mongo-db', default='scrapy_items',
                        help='MongoDB database (default: scrapy_items)')
     parser.add_argument('--mongo-collection', default='toys_normalized',
                        help='MongoDB collection (default: toys_normalized)')
+    parser.add_argument('--concurrency', '-c', type=int, default=4,
+                       help='Batches processed concurrently (default: 4)')
     parser.add_argument('--show-stats', action='store_true',
                        help='Show statistics and exit')
     
     args = parser.parse_args()
+    logging.basicConfig(level=os.getenv('TRANSLATION_LOG', 'INFO'))
     
     # 创建服务实例
     service = TranslationService(
         mongo_uri=args.mongo_uri,
         mongo_db=args.mongo_db,
         mongo_collection=args.mongo_collection,
-        check_interval=args.interval
+        check_interval=args.interval,
+        concurrency=args.concurrency
     )
     
     if args.show_stats:
         # 只显示统计信息
-        service.connect_mongodb()
-        service.show_stats()
-        service.close_mongodb()
+        asyncio.run(service.run_show_stats())
         return
     
     print("Unified Translation Service Configuration:")
@@ -337,7 +490,7 @@ def main():
     print()
     
     # 运行服务
-    service.run()
+    asyncio.run(service.run())
 
 
 if __name__ == "__main__":
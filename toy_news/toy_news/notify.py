@@ -1,10 +1,19 @@
 # notify.py
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
 from threading import Lock
 from scrapy.utils.project import get_project_settings
 
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
 
 class RateLimiter:
     def __init__(self, max_tokens, refill_rate):
@@ -16,20 +25,24 @@ class RateLimiter:
         self.max_tokens = max_tokens
         self.refill_rate = refill_rate
         self.tokens = max_tokens
-        self.last_refill_time = time.time()
+        self.last_refill_time = time.monotonic()
         self.lock = Lock()
 
+    def _refill(self):
+        """
+        Add tokens for the time elapsed since the last refill. Caller must hold the lock.
+        """
+        now = time.monotonic()
+        time_passed = now - self.last_refill_time
+        self.tokens = min(self.max_tokens, self.tokens + time_passed * self.refill_rate)
+        self.last_refill_time = now
+
     def acquire(self):
         """
         Try to acquire a token. Returns True if successful, False if rate limit exceeded.
         """
         with self.lock:
-            now = time.time()
-            time_passed = now - self.last_refill_time
-            new_tokens = time_passed * self.refill_rate
-            self.tokens = min(self.max_tokens, self.tokens + new_tokens)
-            self.last_refill_time = now
-
+            self._refill()
             if self.tokens >= 1:
                 self.tokens -= 1
                 return True
@@ -39,26 +52,62 @@ class RateLimiter:
         """
         Wait until a token becomes available
         """
-        while not self.acquire():
-            time.sleep(0.1)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # 计算下一个令牌到达所需的时间，一次睡够而不是轮询
+                sleep_for = (1.0 - self.tokens) / self.refill_rate
+            time.sleep(max(0.0, sleep_for))
 
 
 # 全局限流器实例
 rate_limiter = RateLimiter(max_tokens=20, refill_rate=1/3)
 
+_HEADERS = {'Content-Type': 'application/json'}
+
+# 复用同一个连接池，避免每次通知都重新握手
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+    ),
+))
+
+_settings_cache = None
+
+
+def _get_cfg():
+    """
+    读取一次项目配置并缓存，返回 (是否启用, webhook 地址)
+    """
+    global _settings_cache
+    if _settings_cache is None:
+        settings = get_project_settings()
+        _settings_cache = (
+            settings.getbool('WECOM_NOTIFY_ENABLED'),
+            settings.get('WECOM_WEBHOOK'),
+        )
+    return _settings_cache
+
 
 def wecom_notify_text(title, content):
     """
     企业微信推送
     """
-    settings = get_project_settings()
-    if not settings.getbool('WECOM_NOTIFY_ENABLED'):
+    enabled, webhook = _get_cfg()
+    if not enabled:
         return
 
     # 等待令牌
     rate_limiter.wait_for_token()
 
-    headers = {'Content-Type': 'application/json'}
     payload = {
         "msgtype": "text",
         "text": {
@@ -68,10 +117,10 @@ def wecom_notify_text(title, content):
     }
 
     try:
-        resp = requests.post(
-            settings['WECOM_WEBHOOK'],
-            data=json.dumps(payload),
-            headers=headers,
+        resp = _session.post(
+            webhook,
+            data=_dumps(payload),
+            headers=_HEADERS,
             timeout=10
         )
         return resp.json()
@@ -83,14 +132,13 @@ def wecom_nofity_image_text(title, description, image_url, url):
     """
     企业微信图文推送
     """
-    settings = get_project_settings()
-    if not settings.getbool('WECOM_NOTIFY_ENABLED'):
+    enabled, webhook = _get_cfg()
+    if not enabled:
         return
 
     # 等待令牌
     rate_limiter.wait_for_token()
 
-    headers = {'Content-Type': 'application/json'}
     payload = {
         "msgtype": "news",
         "news": {
@@ -106,10 +154,10 @@ def wecom_nofity_image_text(title, description, image_url, url):
     }
 
     try:
-        resp = requests.post(
-            settings['WECOM_WEBHOOK'],
-            data=json.dumps(payload),
-            headers=headers,
+        resp = _session.post(
+            webhook,
+            data=_dumps(payload),
+            headers=_HEADERS,
             timeout=10
         )
         return resp.json()
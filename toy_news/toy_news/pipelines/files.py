@@ -11,6 +11,15 @@ import requests
 from twisted.internet import defer
 import hashlib
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def _url_filename(url):
+    """URL 路径中的文件名，同一次运行中相同 URL 只解析一次"""
+    return os.path.basename(urlparse(url).path)
+
 
 class UploadToCOSPipeline:
     def __init__(self, *args, **kwargs):
@@ -22,6 +31,8 @@ class UploadToCOSPipeline:
         self.cos_prefix = settings.get('COS_PREFIX')
         self.is_prod = settings.get('IS_PROD', False)
         self.spider_name = ''
+        # 本地目录 -> {文件名: 文件大小}，每个目录只扫描一次
+        self._dir_cache = {}
 
         if not self.is_prod:
             self.cos_prefix = 'toy_news_dev'
@@ -63,12 +74,28 @@ class UploadToCOSPipeline:
         hash_input = f"{title}|{url}"
         return hashlib.md5(hash_input.encode('utf-8')).hexdigest()[:16]
 
-    def file_path(self, url, item):
-        filename = os.path.basename(urlparse(url).path)
+    def _scan_dir(self, dir_path):
+        """返回目录下已有文件的 {文件名: 大小}，结果按目录缓存"""
+        entries = self._dir_cache.get(dir_path)
+        if entries is None:
+            os.makedirs(dir_path, exist_ok=True)
+            with os.scandir(dir_path) as it:
+                entries = {entry.name: entry.stat().st_size for entry in it if entry.is_file()}
+            self._dir_cache[dir_path] = entries
+        return entries
+
+    def _item_dir(self, item):
+        """Item 的相对存储目录，每个 item 只计算一次哈希"""
         # 使用哈希值而不是完整标题来避免路径过长
         title_hash = self._get_title_hash(item)
-        path = f"{self.cos_prefix}/{self.spider_name}/{item.get('ip')}/{title_hash}/{filename}"
+        return f"{self.cos_prefix}/{self.spider_name}/{item.get('ip')}/{title_hash}"
+
+    def _path_for(self, url, item_dir):
+        path = f"{item_dir}/{_url_filename(url)}"
         return path.lstrip('/')  # Remove leading slash
+
+    def file_path(self, url, item):
+        return self._path_for(url, self._item_dir(item))
     
     def process_item(self, item, spider):
         spider.logger.info("="*50)
@@ -85,19 +112,21 @@ class UploadToCOSPipeline:
             return item
 
         # Step 1: Download all files
+        item_dir = self._item_dir(item)
         for file_url in file_urls:
-            filepath = self.file_path(file_url, item)
+            filepath = self._path_for(file_url, item_dir)
             spider.logger.info(f"Filepath: {filepath}")
             local_path = os.path.join(self.files_store, filepath)
             
             spider.logger.info(f"Processing file: {file_url}")
             spider.logger.info(f"Local path: {local_path}")
             
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            # Create directory if it doesn't exist, and list it once per item dir
+            local_dir, filename = os.path.split(local_path)
+            existing = self._scan_dir(local_dir)
             
             # Download file if it doesn't exist locally
-            if not os.path.exists(local_path):
+            if filename not in existing:
                 try:
                     spider.logger.info(f"Downloading file: {file_url}")
                     headers = {
@@ -114,70 +143,29 @@ class UploadToCOSPipeline:
                     
                     with open(local_path, 'wb') as f:
                         f.write(response.content)
+                    existing[filename] = len(response.content)
                     spider.logger.info(f"Successfully downloaded to: {local_path}")
                 except Exception as e:
                     spider.logger.error(f"Failed to download {file_url}: {str(e)}")
                     continue
             
             # Verify file exists and has content
-            if os.path.exists(local_path) and os.path.getsize(local_path) > 0:
+            file_size = existing.get(filename, 0)
+            if file_size > 0:
                 local_files.append(local_path)
                 spider.logger.info(f"File ready for processing: {local_path}")
-                spider.logger.info(f"File size: {os.path.getsize(local_path)} bytes")
+                spider.logger.info(f"File size: {file_size} bytes")
             else:
                 spider.logger.error(f"File not available: {local_path}")
 
         spider.logger.info(f"Total local files ready for processing: {len(local_files)}")
         spider.logger.info(f"Local files: {local_files}")
 
-        # Step 2: Process all local files for CDN upload
-        cdn_keys = []
-        for local_path in local_files:
-            # Generate COS key from local path
-            cos_key = os.path.relpath(local_path, self.files_store).replace('\\', '/').lstrip('/')
-            # URL encode the key, but preserve forward slashes
-            cos_key = '/'.join(quote(part, safe='') for part in cos_key.split('/'))
-            spider.logger.info(f"Processing for CDN: {cos_key}")
-            
-            try:
-                # Check if file exists in COS
-                try:
-                    spider.logger.info(f"Checking if file exists in COS: {cos_key}")
-                    spider.logger.info(f"Using bucket: {self.bucket}")
-                    spider.logger.info(f"Using region: {self.region}")
-                    self.cos_client.head_object(
-                        Bucket=self.bucket,
-                        Key=cos_key
-                    )
-                    spider.logger.info(f"File already exists in COS: {cos_key}")
-                    cdn_keys.append(cos_key)
-                    spider.logger.info(f"Added existing key to cdn_keys. Current count: {len(cdn_keys)}")
-                    continue
-                except Exception as e:
-                    error_dict = getattr(e, '__dict__', {})
-                    spider.logger.info(f"Error dict: {error_dict}")
-                    if error_dict.get('_status_code') == 404:
-                        spider.logger.info(f"File does not exist in COS, will upload: {cos_key}")
-                    else:
-                        spider.logger.error(f"Error checking COS: {str(e)}")
-                        raise e
-
-                # Upload to COS
-                spider.logger.info(f"Uploading to COS: {cos_key}")
-                response = self.cos_client.upload_file(
-                    Bucket=self.bucket,
-                    LocalFilePath=local_path,
-                    Key=cos_key
-                )
-                spider.logger.info(f"COS upload response: {response['ETag']}")
-                cdn_keys.append(cos_key)
-                spider.logger.info(f"Added new key to cdn_keys. Current count: {len(cdn_keys)}")
-                spider.logger.info(f"Successfully uploaded to COS: {cos_key}")
-            except Exception as e:
-                spider.logger.error(f"Failed to upload to COS: {str(e)}")
-                spider.logger.error(f"Error type: {type(e)}")
-                spider.logger.error(f"Error details: {str(e)}")
-                continue
+        # Step 2: Process all local files for CDN upload (concurrently)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(self._upload_to_cos, local_path, spider) for local_path in local_files]
+            cdn_keys = [cos_key for cos_key in (f.result() for f in futures) if cos_key]
+        spider.logger.info(f"COS upload finished: {len(cdn_keys)}/{len(local_files)} files available")
 
         # Step 3: Update item with CDN keys
         if cdn_keys:
@@ -200,6 +188,37 @@ class UploadToCOSPipeline:
         
         return item
 
+    def _upload_to_cos(self, local_path, spider):
+        """上传单个本地文件到 COS，已存在则跳过，返回 cos_key，失败返回 None"""
+        # Generate COS key from local path
+        cos_key = os.path.relpath(local_path, self.files_store).replace('\\', '/').lstrip('/')
+        # URL encode the key, but preserve forward slashes
+        cos_key = '/'.join(quote(part, safe='') for part in cos_key.split('/'))
+
+        try:
+            # Check if file exists in COS
+            try:
+                self.cos_client.head_object(
+                    Bucket=self.bucket,
+                    Key=cos_key
+                )
+                return cos_key
+            except Exception as e:
+                error_dict = getattr(e, '__dict__', {})
+                if error_dict.get('_status_code') != 404:
+                    raise e
+
+            # Upload to COS
+            self.cos_client.upload_file(
+                Bucket=self.bucket,
+                LocalFilePath=local_path,
+                Key=cos_key
+            )
+            return cos_key
+        except Exception as e:
+            spider.logger.error(f"Failed to upload to COS: {cos_key} ({type(e).__name__}: {str(e)})")
+            return None
+
     def _sign_bandai_hobby_file_url(self, url):
         API_URL = 'https://assets-signedurl.bandai-hobby.net/get-signed-url'
         API_OS_URL = 'https://assets-signedurl-global.bandai-hobby.net/get-signed-url'
@@ -3,22 +3,44 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 import re
+import asyncio
+import hashlib
 from itemadapter import ItemAdapter
 import pymongo
+from pymongo import UpdateOne
+from bson import ObjectId
+from toy_news.pipelines.mongo_pool import get_async_client
+from scrapy.utils.defer import deferred_from_coro
 from datetime import datetime
 
+
+def goods_key(name):
+    """goodsName 的定长摘要，作为 upsert 键，索引比长日文字符串小得多"""
+    return hashlib.blake2b(name.encode("utf-8"), digest_size=12).digest()
+
+
 class PurifyPipeline:
     """
     处理一些数据, 比如发售日期
     """
+    # 每处理这么多条 item 刷新一次年份缓存，防止爬取跨年
+    YEAR_REFRESH_INTERVAL = 1000
+
+    def open_spider(self, spider):
+        self._year_cache = datetime.now().year
+        self._count = 0
+
     def add_year_if_missing(self, text):
         # 如果字符串不以4位数字开头（简单检查）
-        if not text[:4].isdigit():
-            current_year = datetime.now().year
-            return f"{current_year}年{text}"
+        if text and not text[:4].isdigit():
+            return f"{self._year_cache}年{text}"
         return text
 
     def process_item(self, item, spider):
+        self._count += 1
+        if self._count % self.YEAR_REFRESH_INTERVAL == 0:
+            self._year_cache = datetime.now().year
+
         adapter = ItemAdapter(item)
         adapter["releaseDate"] = self.add_year_if_missing(adapter["releaseDate"])
         return item
@@ -27,10 +49,12 @@ class JumpCalMongoPipeline:
     """
     存储到db
     """
-    def __init__(self, mongo_uri, mongo_db, mongo_collection):
+    def __init__(self, mongo_uri, mongo_db, mongo_collection, batch_size=100, write_concurrency=4):
         self.mongo_uri = mongo_uri
         self.mongo_db = mongo_db
         self.mongo_collection = mongo_collection
+        self._batch_size = batch_size
+        self._write_concurrency = write_concurrency
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -39,79 +63,140 @@ class JumpCalMongoPipeline:
         return cls(
             mongo_uri=crawler.settings.get("MONGO_URI"),
             mongo_db=crawler.settings.get("MONGO_DATABASE", "scrapy_items"),
-            mongo_collection=mongo_collection
+            mongo_collection=mongo_collection,
+            batch_size=crawler.settings.getint("MONGO_BATCH_SIZE", 100),
+            write_concurrency=crawler.settings.getint("MONGO_WRITE_CONCURRENCY", 4),
         )
 
     def open_spider(self, spider):
-        self.client = pymongo.MongoClient(self.mongo_uri)
+        # 使用 motor 异步驱动，数据库 I/O 期间不阻塞 Twisted reactor
+        return deferred_from_coro(self._open_spider(spider))
+
+    async def _open_spider(self, spider):
+        self.client = get_async_client(self.mongo_uri)
         self.db = self.client[self.mongo_db]
         self.collection = self.db[self.mongo_collection]
-        # 创建唯一索引（如果尚未存在）
-        self.collection.create_index("goodsName", unique=True)
-
-        # Define the validator schema
-        validator = {
-            "$jsonSchema": {
-                "bsonType": "object",
-                "required": ["createdAt", "updatedAt"],  # Enforce these fields
-                "properties": {
-                    "createdAt": {
-                        "bsonType": "date",
-                        "description": "must be a date and is required"
-                    },
-                    "updatedAt": {
-                        "bsonType": "date",
-                        "description": "must be a date and is required"
-                    }
-                }
-            }
-        }
-        if self.mongo_collection not in self.db.list_collection_names():
-            self.db.create_collection(self.mongo_collection, validator=validator)
-        else:
-            # Update existing collection's validator
-            self.db.command({
-                "collMod": self.mongo_collection,
-                "validator": validator
-            })
+
+        # 写操作缓冲，攒够一批再 bulk_write；
+        # 最多 write_concurrency 批同时在途，超出时 process_item 等待
+        self._buffer = []
+        self._writes = set()
+        self._write_slots = asyncio.Semaphore(self._write_concurrency)
+        # goodsName -> {_id, price, releaseDate}，一次读取，
+        # 后续 item 的 _id 分配和变更判断都无需再逐条查询
+        self._known = {}
+        backfill = []
+        async for doc in self.collection.find({}, {"goodsName": 1, "_key": 1, "price": 1, "releaseDate": 1}):
+            name = doc.pop("goodsName", None)
+            if name is None:
+                continue
+            # 旧文档补上 _key，之后统一以 _key 作为 upsert 条件
+            if doc.pop("_key", None) is None:
+                backfill.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"_key": goods_key(name)}}))
+            self._known[name] = doc
+        if backfill:
+            await self.collection.bulk_write(backfill, ordered=False)
+            spider.logger.info(f"Backfilled _key for {len(backfill)} documents")
+
+        # validator 等集合配置由 scripts/jump_cal_migrate.py 一次性设置，
+        # 这里只在索引缺失时补建
+        indexes = await self.collection.index_information()
+        if "_key_1" not in indexes:
+            await self.collection.create_index("_key", unique=True, sparse=True)
+        # _key 补齐并建好唯一索引后，旧的 goodsName 唯一索引只会拖慢每次 upsert
+        if "goodsName_1" in indexes:
+            await self.collection.drop_index("goodsName_1")
+            spider.logger.info("Dropped goodsName_1 index superseded by _key")
 
     def close_spider(self, spider):
-        self.client.close()
+        return deferred_from_coro(self._close_spider(spider))
 
+    async def _close_spider(self, spider):
+        # 等待在途的批次，再写入剩余缓冲
+        if self._writes:
+            await asyncio.gather(*self._writes)
+        await self._flush(spider)
 
-    def process_item(self, item, spider):
-        # Add timestamps to the item
-        now = datetime.now()
+    async def _flush(self, spider):
+        """将缓冲的 upsert 一次性写入"""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        await self._write(batch, spider)
 
-        adapter = ItemAdapter(item)
+    async def _flush_in_background(self, spider):
+        """将缓冲交给后台任务写入，不阻塞后续 item"""
+        batch, self._buffer = self._buffer, []
+        await self._write_slots.acquire()
+        task = asyncio.ensure_future(self._write(batch, spider))
+        self._writes.add(task)
 
-        # 使用标题作为查询条件
-        query = {"goodsName": adapter["goodsName"]}
+        def _done(t):
+            self._writes.discard(t)
+            self._write_slots.release()
 
-        old_data = self.collection.find_one(query)
+        task.add_done_callback(_done)
 
-        # 设置更新操作（$set 更新所有字段）
-        update = {
-            "$setOnInsert": {"createdAt": now},
-            "$set": {"updatedAt":now, **adapter.asdict()},
-        }
+    @staticmethod
+    def _build_ops(batch):
+        """缓冲的 (_key, 字段, _id) 转为 UpdateOne，整批共用一个时间戳"""
+        now = datetime.now()
+        return [
+            UpdateOne(
+                {"_key": key},
+                {
+                    "$setOnInsert": {"_id": _id, "createdAt": now},
+                    "$set": {**data, "updatedAt": now},
+                },
+                upsert=True,
+            )
+            for key, data, _id in batch
+        ]
 
+    async def _write(self, batch, spider):
+        batch = self._build_ops(batch)
         try:
-            # 存在则更新，不存在则插入
-            result = self.collection.update_one(
-                query,
-                update,
-                upsert=True
+            # 字段都由本 pipeline 生成，跳过服务端 validator 校验
+            result = await self.collection.bulk_write(batch, ordered=False, bypass_document_validation=True)
+            spider.logger.info(
+                f"Bulk upserted {len(batch)} items "
+                f"(inserted: {result.upserted_count}, modified: {result.modified_count})"
             )
-            new_data = self.collection.find_one(query)
-            
-            adapter['_id'] = new_data['_id']
-            item['_id'] = new_data['_id']
-        
-            spider.logger.info(f"Upserted item with name: {adapter['goodsName']}")
-        except pymongo.errors.DuplicateKeyError:
-            spider.logger.warning(f"Duplicate name found: {adapter['goodsName']}")
+        except pymongo.errors.BulkWriteError as e:
+            spider.logger.warning(f"Bulk write errors: {e.details.get('writeErrors')}")
         except Exception as e:
-            spider.logger.error(f"Error processing item: {e}")
+            spider.logger.error(f"Error flushing items: {e}")
+
+
+    async def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        # 只构建一次字段字典，$set 和变更判断共用
+        data = adapter.asdict()
+        name = data["goodsName"]
+        price = data.get("price")
+        release_date = data.get("releaseDate")
 
-        return item
\ No newline at end of file
+        # 使用标题摘要作为查询条件，$set 更新所有字段；
+        # createdAt/updatedAt 在写入时按批统一设置
+        key = goods_key(name)
+        data["_key"] = key
+
+        # 已存在的文档沿用原 _id，新文档在客户端预先分配 _id，
+        # 这样无需等待写入即可把 _id 交给后续 pipeline
+        old = self._known.get(name)
+        if old is None:
+            _id = ObjectId()
+            spider.logger.info(f"新增: {name}")
+        else:
+            _id = old["_id"]
+            if old.get("price") != price or old.get("releaseDate") != release_date:
+                spider.logger.info(f"更新: {name} (price/releaseDate changed)")
+        self._known[name] = {"_id": _id, "price": price, "releaseDate": release_date}
+
+        self._buffer.append((key, data, _id))
+        adapter['_id'] = _id
+
+        if len(self._buffer) >= self._batch_size:
+            await self._flush_in_background(spider)
+
+        return item
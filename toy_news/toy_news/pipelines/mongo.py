@@ -2,6 +2,7 @@ import re
 import textwrap
 from itemadapter import ItemAdapter
 import pymongo
+from toy_news.pipelines.mongo_pool import get_client
 from datetime import datetime, timezone
 from bson import ObjectId
 
@@ -32,7 +33,7 @@ class MongoDBPipeline:
         )
 
     def open_spider(self, spider):
-        self.client = pymongo.MongoClient(self.mongo_uri)
+        self.client = get_client(self.mongo_uri)
         self.db = self.client[self.mongo_db]
         self.collection = self.db[self.mongo_collection]
         
@@ -85,6 +86,7 @@ class MongoDBPipeline:
         # Compound indexes for common queries
         self.history_collection.create_index([("data_id", 1), ("version", -1)])
         self.history_collection.create_index([("url", 1), ("timestamp", -1)])
+        self.history_collection.create_index([("url", 1), ("version", -1)])
         
         spider.logger.info(f"History collection '{self.history_collection_name}' initialized")
     
@@ -132,9 +134,6 @@ class MongoDBPipeline:
         except Exception as e:
             spider.logger.error(f"Error saving history for {url}: {e}")
 
-    def close_spider(self, spider):
-        self.client.close()
-
     def process_item(self, item, spider):
         # Add timestamps to the item
         now = datetime.now(timezone.utc)
@@ -0,0 +1,42 @@
+"""
+进程内共享的 MongoDB 客户端
+
+各个 pipeline 各自创建 MongoClient 会产生多套连接池和监控线程，
+这里按 uri 缓存，同一进程内所有 pipeline 共用一个客户端。
+客户端随进程退出关闭，pipeline 不需要在 close_spider 中 close。
+"""
+import asyncio
+import atexit
+from functools import lru_cache
+
+import pymongo
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# 爬虫数据可重跑补齐，因此放宽写关注换吞吐：w=1 且不等待 journal，
+# 进程崩溃时可能丢失最后一批 upsert，下次运行会重新写入
+_CLIENT_OPTIONS = dict(
+    maxPoolSize=200,
+    w=1,
+    journal=False,
+    compressors="zstd,zlib",
+    retryWrites=True,
+    serverSelectionTimeoutMS=5000,
+)
+
+
+@lru_cache(maxsize=None)
+def get_client(uri):
+    """同步 pymongo 客户端"""
+    client = pymongo.MongoClient(uri, **_CLIENT_OPTIONS)
+    atexit.register(client.close)
+    return client
+
+
+@lru_cache(maxsize=None)
+def _get_async_client(uri, loop):
+    return AsyncIOMotorClient(uri, io_loop=loop, **_CLIENT_OPTIONS)
+
+
+def get_async_client(uri):
+    """motor 异步客户端，motor 客户端绑定事件循环，因此按 (uri, 当前循环) 缓存"""
+    return _get_async_client(uri, asyncio.get_running_loop())
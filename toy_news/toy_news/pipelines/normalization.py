@@ -4,6 +4,7 @@
 """
 
 import pymongo
+from .mongo_pool import get_client
 from datetime import datetime, timezone
 from ..items import DataMapper
 from itemadapter import ItemAdapter
@@ -28,7 +29,7 @@ class DataNormalizationPipeline:
         )
         
     def open_spider(self, spider):
-        self.client = pymongo.MongoClient(self.mongo_uri)
+        self.client = get_client(self.mongo_uri)
         self.db = self.client[self.mongo_db]
         self.normalized_collection = self.db[self.mongo_collection]
         
@@ -36,9 +37,6 @@ class DataNormalizationPipeline:
         self.normalized_collection.create_index('product_hash', unique=True)
         self.normalized_collection.create_index([('source', 1), ('ip', 1)])
         
-    def close_spider(self, spider):
-        self.client.close()
-        
     def process_item(self, item, spider):
         """处理爬取的数据 - 只进行归一化"""
         adapter = ItemAdapter(item)
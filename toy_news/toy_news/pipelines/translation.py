@@ -1,5 +1,8 @@
+from collections import OrderedDict
 from itemadapter import ItemAdapter
 import pymongo
+from toy_news.pipelines.mongo_pool import get_async_client
+from scrapy.utils.defer import deferred_from_coro
 from datetime import datetime
 import json
 import redis
@@ -10,7 +13,10 @@ class TranslationPipeline:
     只处理包含product_hash的归一化数据
     只添加到翻译队列，不修改原始item
     """
-    def __init__(self, mongo_uri, mongo_db, mongo_collection, blognews_collection, redis_host, redis_password, redis_port, redis_db, redis_translation_queue):
+    # 最近查询过的 product_hash -> 已翻译字段，重复出现时跳过数据库查询
+    SEEN_CACHE_SIZE = 10000
+
+    def __init__(self, mongo_uri, mongo_db, mongo_collection, blognews_collection, redis_host, redis_password, redis_port, redis_db, redis_translation_queue, queue_batch_size=100):
         self.mongo_uri = mongo_uri
         self.mongo_db = mongo_db
         self.mongo_collection = mongo_collection
@@ -21,6 +27,13 @@ class TranslationPipeline:
         self.redis_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db, password=redis_password)
         # 归一化数据的标准翻译字段
         self.fields_to_translate = ['name', 'description']
+        self._seen_translated = OrderedDict()
+        # 只取回译文字段，减少每次查询的 BSON 传输和解码
+        self._translated_projection = {f'{field}CN': 1 for field in self.fields_to_translate}
+        self._translated_projection['_id'] = 0
+        # 待推送的队列消息，攒够一批再一次 lpush
+        self._queue_buffer = []
+        self._queue_batch_size = queue_batch_size
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -47,11 +60,15 @@ class TranslationPipeline:
             redis_port=redis_port,
             redis_db=redis_db,
             redis_translation_queue=crawler.settings.get('TRANSLATION_QUEUE', 'toys:translation:pending'),
+            queue_batch_size=crawler.settings.getint('TRANSLATION_QUEUE_BATCH_SIZE', 100),
         )
 
     def open_spider(self, spider):
-        # 连接 MongoDB
-        self.client = pymongo.MongoClient(self.mongo_uri)
+        return deferred_from_coro(self._open_spider(spider))
+
+    async def _open_spider(self, spider):
+        # 连接 MongoDB（motor 异步驱动，不阻塞 reactor）
+        self.client = get_async_client(self.mongo_uri)
         self.db = self.client[self.mongo_db]
         
         # 归一化数据集合
@@ -59,7 +76,7 @@ class TranslationPipeline:
         # self.pending_collection = self.db['toys_translation_pending']
         
         # 创建索引
-        self.normalized_collection.create_index('product_hash', unique=True)
+        await self.normalized_collection.create_index('product_hash', unique=True)
         # self.pending_collection.create_index('product_hash', unique=True)
         
         # 测试 Redis 连接
@@ -78,15 +95,14 @@ class TranslationPipeline:
         spider.logger.info(f"Translation queue: {self.translation_queue}")
 
     def close_spider(self, spider):
+        self._flush_queue(spider)
+        
         # 显示待翻译队列状态
         pending_count = self.redis_client.llen(self.translation_queue)
         if pending_count > 0:
             spider.logger.info(f"Spider closed with {pending_count} items in translation queue")
-        
-        if self.client:
-            self.client.close()
 
-    def process_item(self, item, spider):
+    async def process_item(self, item, spider):
         if not item:
             return None
         
@@ -103,95 +119,109 @@ class TranslationPipeline:
         
         if product_hash:
             # 处理商品数据
-            return self._process_product_translation(item, spider, product_hash)
+            return await self._process_product_translation(item, spider, product_hash)
         else:
             # 不是归一化数据，直接返回
             return item
     
-    def _process_product_translation(self, item, spider, product_hash):
+    async def _process_product_translation(self, item, spider, product_hash):
         """处理商品数据翻译"""
         adapter = ItemAdapter(item)
         spider.logger.debug(f"Processing translation queue for product: {product_hash}")
         
+        # 没有任何待翻译内容时直接返回，省去数据库查询和队列写入
+        payload = {field: adapter.get(field) for field in self.fields_to_translate}
+        if not any(payload.values()):
+            return item
+        
         # 检查归一化数据是否已经有翻译
-        normalized_doc = self.normalized_collection.find_one({'product_hash': product_hash})
-        if normalized_doc:
+        translated_fields = await self._get_translated_fields(product_hash)
+        if translated_fields is not None:
             # 检查每个字段的翻译状态
-            translated_fields = []
-            untranslated_fields = []
-            
-            for field in self.fields_to_translate:
-                translated_field = f'{field}CN'
-                if translated_field in normalized_doc and normalized_doc[translated_field]:
-                    # 已翻译的字段
-                    translated_fields.append(field)
-                else:
-                    # 未翻译的字段
-                    if field in adapter and adapter[field]:
-                        untranslated_fields.append(field)
+            untranslated = {field: value for field, value in payload.items() if value and field not in translated_fields}
             
             if translated_fields:
                 spider.logger.debug(f"Found existing translations for {product_hash}: {translated_fields}")
             
-            if not untranslated_fields:
+            if not untranslated:
                 # 所有字段都已翻译，直接返回原始item（不修改）
                 spider.logger.debug(f"All fields already translated for: {product_hash}")
                 return item
             else:
                 # 还有未翻译的字段，添加到翻译队列
-                spider.logger.debug(f"Need translation for {product_hash}: {untranslated_fields}")
-                self._add_to_translation_queue(adapter, spider, untranslated_fields)
+                spider.logger.debug(f"Need translation for {product_hash}: {list(untranslated)}")
+                self._add_to_translation_queue(adapter, spider, untranslated)
         else:
             # 文档不存在，将所有需要翻译的字段添加到队列
-            untranslated_fields = [field for field in self.fields_to_translate if field in adapter and adapter[field]]
-            if untranslated_fields:
-                self._add_to_translation_queue(adapter, spider, untranslated_fields)
+            self._add_to_translation_queue(adapter, spider, {field: value for field, value in payload.items() if value})
         
         # 返回原始item，不添加翻译字段
         return item
     
-    def _add_to_translation_queue(self, adapter, spider, fields_to_translate=None):
-        """将归一化数据添加到翻译队列"""
-        if fields_to_translate is None:
-            fields_to_translate = self.fields_to_translate
-            
+    async def _get_translated_fields(self, product_hash):
+        """返回已翻译的字段列表，文档不存在时返回 None；结果在进程内做 LRU 缓存"""
+        try:
+            self._seen_translated.move_to_end(product_hash)
+            return self._seen_translated[product_hash]
+        except KeyError:
+            pass
+        
+        normalized_doc = await self.normalized_collection.find_one(
+            {'product_hash': product_hash},
+            self._translated_projection,
+        )
+        if not normalized_doc:
+            return None
+        
+        translated_fields = [field for field in self.fields_to_translate if normalized_doc.get(f'{field}CN')]
+        self._seen_translated[product_hash] = translated_fields
+        if len(self._seen_translated) > self.SEEN_CACHE_SIZE:
+            self._seen_translated.popitem(last=False)
+        return translated_fields
+    
+    def _flush_queue(self, spider):
+        """将缓冲的消息一次性推入 Redis 翻译队列"""
+        if not self._queue_buffer:
+            return
+        messages, self._queue_buffer = self._queue_buffer, []
+        try:
+            self.redis_client.lpush(self.translation_queue, *messages)
+            spider.logger.debug(f"Pushed {len(messages)} messages to translation queue")
+        except Exception as e:
+            spider.logger.error(f"Error pushing to translation queue: {e}")
+    
+    def _add_to_translation_queue(self, adapter, spider, translation_fields):
+        """将归一化数据添加到翻译队列，translation_fields 为 {字段: 原文}"""
         try:
             # 准备元数据
             metadata = {}
             if adapter.get('product_hash'):
                 metadata['product_hash'] = adapter.get('product_hash')
             
-            # 准备需要翻译的字段
-            translation_fields = {}
-            for field in fields_to_translate:
-                if field in adapter and adapter[field]:
-                    translation_fields[field] = adapter[field]
-            
-            # 如果没有需要翻译的内容，直接返回
-            if not translation_fields:
-                return
-            
             # 构建符合Go Message结构的消息格式
+            now = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
             queue_message = {
                 "id": str(uuid.uuid4()),
                 "source": adapter.get('source'),
                 "type":  "translation",
                 "payload": {
                     "_id": adapter.get('_id'),
-                    "created_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "created_at": now,
                     **metadata,
                     **translation_fields,
                 },
-                "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "timestamp": now,
                 "attempts": 0,
                 "max_retries": 3
             }
             
-            # 插入到待redis中的翻译队列
-            self.redis_client.lpush(self.translation_queue, json.dumps(queue_message))
+            # 插入到待redis中的翻译队列（缓冲后批量推送）
+            self._queue_buffer.append(json.dumps(queue_message))
+            if len(self._queue_buffer) >= self._queue_batch_size:
+                self._flush_queue(spider)
             
             hash_key = adapter.get('product_hash')
-            spider.logger.debug(f"Added to translation queue: {hash_key} (fields: {fields_to_translate})")
+            spider.logger.debug(f"Added to translation queue: {hash_key} (fields: {list(translation_fields)})")
             
         except pymongo.errors.DuplicateKeyError:
             # 已存在，忽略
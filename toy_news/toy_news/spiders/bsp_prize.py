@@ -1,5 +1,21 @@
 import scrapy
 from datetime import datetime
+from urllib.parse import urljoin
+from parsel.csstranslator import HTMLTranslator
+
+
+# CSS 选择器在模块加载时一次性转换为 XPath，避免每个 response 重复翻译
+_T = HTMLTranslator()
+_SEL_LINKS = _T.css_to_xpath(".products_list .products_item a")
+_SEL_TITLE = _T.css_to_xpath("h1.headLine1::text")
+_SEL_DATE = _T.css_to_xpath(".contents .releaseDate::text")
+_SEL_DESC = _T.css_to_xpath(".productDetail_body  p *::text")
+# 在选择阶段由 lxml 过滤掉 javascript: 链接
+_SEL_GALLERY = _T.css_to_xpath('.productDetail_imgs a:not([href*="javascript"])::attr(href)')
+_SEL_THUMBS = _T.css_to_xpath(".productDetail_imgs img::attr(src)")
+# 面包屑中每个角色链接的第一个后代文本节点（与 ::text 后取 .get() 一致），一次遍历取完
+_SEL_CHARACTERS = _T.css_to_xpath('.pankuzu_item a[href*="charac"]') + "/descendant::text()[1]"
+
 
 class BspPrizeSpider(scrapy.Spider):
     domain = "https://bsp-prize.jp"
@@ -23,28 +39,27 @@ class BspPrizeSpider(scrapy.Spider):
             yield scrapy.Request(url=url, callback=self.parse)
 
     def parse(self, response):
-        links = response.css('.products_list .products_item a')
+        links = response.xpath(_SEL_LINKS)
         # reverse the links
         for link in reversed(links):
             yield response.follow(link, callback=self.parse_detail)
         
     def parse_detail(self, response):
-        def extract_with_css(query):
-            return response.css(query).get(default="").strip()
+        def extract_with_xpath(query):
+            return response.xpath(query).get(default="").strip()
 
-        description = ""
-        for part in response.css('.productDetail_body  p *::text').getall():  # Iterate through all text and <br>
-            description += part +'\n'
+        # Iterate through all text and <br>，一次 join 代替逐段 +=
+        description = "".join(f"{part}\n" for part in response.xpath(_SEL_DESC).getall())
 
         # Extract the data you want from the response
         data = {
             'url': response.url,
-            'title': extract_with_css("h1.headLine1::text"),
-            'releaseDate': extract_with_css(".contents .releaseDate::text"),     
-            'gallery': [self.domain + i for i in response.css(".productDetail_imgs a::attr(href)").getall() if "javascript" not in i ],
-            'thumbs': [self.domain + i for i in response.css(".productDetail_imgs img::attr(src)").getall()],
+            'title': extract_with_xpath(_SEL_TITLE),
+            'releaseDate': extract_with_xpath(_SEL_DATE),     
+            'gallery': [urljoin(self.domain, i) for i in response.xpath(_SEL_GALLERY).getall()],
+            'thumbs': [urljoin(self.domain, i) for i in response.xpath(_SEL_THUMBS).getall()],
             'desc': description,            
-            'characters': [i.css("::text").get() for i in response.css('.pankuzu_item a') if ("charac" in i.css("::attr(href)").get())],
+            'characters': response.xpath(_SEL_CHARACTERS).getall(),
             'ip': self.ip,
         }
 
@@ -2,6 +2,21 @@ import scrapy
 from datetime import datetime
 from scrapy.utils.project import get_project_settings
 import urllib.parse
+from parsel.csstranslator import HTMLTranslator
+
+
+# CSS 选择器在模块加载时一次性转换为 XPath，避免每个 <li> 重复翻译
+_T = HTMLTranslator()
+_SEL_CAL_LIST = _T.css_to_xpath(".callist li:nth-child(n+2)")
+_SEL_DATE = _T.css_to_xpath("h5::text")
+_SEL_ITEMS = _T.css_to_xpath("ul > li")
+_SEL_IMAGES = _T.css_to_xpath("img::attr(src)")
+_SEL_GENRE = _T.css_to_xpath(".genre2::text")
+_SEL_TITLE = _T.css_to_xpath(".title2::text")
+_SEL_TITLE_A = _T.css_to_xpath(".title2 a::text")
+_SEL_PRICE = _T.css_to_xpath(".price2::text")
+_SEL_MAKER = _T.css_to_xpath(".maker2::text")
+
 
 class JumpcalSpider(scrapy.Spider):
     name = "jump_cal"
@@ -30,21 +45,21 @@ class JumpcalSpider(scrapy.Spider):
         yield from self.parse_detail(response)
 
     def parse_detail(self, response):
-        cal_list = response.css(".callist li:nth-child(n+2)")
+        cal_list = response.xpath(_SEL_CAL_LIST)
 
         for group in cal_list:
-            release_date = group.css("h5::text").get()
-            for item in group.css("ul > li"):
+            release_date = group.xpath(_SEL_DATE).get()
+            for item in group.xpath(_SEL_ITEMS):
                 # Get image URLs
-                image_urls = item.css("img::attr(src)").getall()
+                image_urls = item.xpath(_SEL_IMAGES).getall()
                 file_urls = [urllib.parse.urljoin(response.url, url) for url in image_urls]
 
                 data = {
                     'releaseDate': release_date,
-                    'genre': item.css(".genre2::text").get().strip(),
-                    'goodsName': item.css('.title2::text').get(default="").strip() or item.css('.title2 a::text').get().strip(),
-                    'price': item.css(".price2::text").get().strip(),
-                    'maker': item.css(".maker2::text").get().strip(),
+                    'genre': item.xpath(_SEL_GENRE).get().strip(),
+                    'goodsName': item.xpath(_SEL_TITLE).get(default="").strip() or item.xpath(_SEL_TITLE_A).get().strip(),
+                    'price': item.xpath(_SEL_PRICE).get().strip(),
+                    'maker': item.xpath(_SEL_MAKER).get().strip(),
                     'ip': self.ip,
                     'url': response.url,
                     'file_urls': file_urls,  # Add file URLs for download
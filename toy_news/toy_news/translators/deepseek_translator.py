@@ -1,29 +1,259 @@
 import os
+import re
+import json
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import List, Dict
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, RateLimitError
+from pymongo import UpdateOne
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+
+logger = logging.getLogger(__name__)
+
+# JSON 解析失败时兜底：提取 "1. 译文" 形式的编号行
+_LINE_RE = re.compile(r'^\s*\d+\.\s*(.+?)\s*$', re.M)
+
+try:
+    import diskcache
+except ImportError:  # 未安装时不启用本地磁盘缓存
+    diskcache = None
+
+
+class TokenBucket:
+    """按每分钟请求数 (RPM) 和 token 数 (TPM) 限流的令牌桶，容量按时间线性补充"""
+    
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int):
+        """等待直到有一个请求名额和 tokens 个 token 可用"""
+        tokens = min(tokens, self.tpm)
+        while True:
+            self._refill()
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                return
+            await asyncio.sleep(max(
+                (1 - self._requests) * 60 / self.rpm,
+                (tokens - self._tokens) * 60 / self.tpm,
+            ))
+
+    def adjust(self, estimated: int, actual: int):
+        """用响应中的实际用量修正预估值"""
+        self._tokens -= actual - estimated
 
 
 class DeepSeekTranslator:
     """A translator class that uses DeepSeek API for Japanese to Chinese translation."""
     
-    def __init__(self, api_key: str = None, base_url: str = "https://api.deepseek.com"):
+    # 进程内缓存的译文条数
+    MEMO_SIZE = 4096
+    # 单次 API 请求的预估 token / 文本条数上限：尽量把多条文本打包进一个请求，
+    # 用满 TPM 而不是先耗尽 RPM
+    CHUNK_MAX_TOKENS = 3000
+    CHUNK_MAX_ITEMS = 100
+    # 单个分块失败（如返回条数不符）时的重试次数
+    CHUNK_RETRIES = 1
+    # 进程内所有实例共用的 HTTP 连接池
+    _http_client = None
+    
+    def __init__(self, api_key: str = None, base_url: str = "https://api.deepseek.com", max_concurrency: int = 8,
+                 rpm: int = 300, tpm: int = 1_000_000):
         """
         Initialize the DeepSeek translator.
         
         Args:
             api_key (str, optional): DeepSeek API key. If not provided, will try to get from environment.
             base_url (str, optional): DeepSeek API base URL. Defaults to "https://api.deepseek.com".
+            max_concurrency (int, optional): Maximum number of in-flight API requests. Defaults to 8.
+            rpm (int, optional): Client-side requests-per-minute budget. Defaults to 300.
+            tpm (int, optional): Client-side tokens-per-minute budget. Defaults to 1,000,000.
         """
         self.api_key = api_key or os.getenv('DEEPSEEK_API_KEY')
         if not self.api_key:
             raise ValueError("DeepSeek API key is required. Set DEEPSEEK_API_KEY environment variable or pass api_key parameter.")
             
-        self.client = OpenAI(api_key=self.api_key, base_url=base_url)
-        self.model = "deepseek-coder"
-        self.temperature = 1.3
+        # 异步客户端 + HTTP/2 长连接，并发请求复用同一条 TLS 连接；
+        # 调用方需在同一个事件循环中使用，结束时调用 aclose()
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=base_url,
+            http_client=self._get_http_client(),
+        )
+        # 限制同时在途的请求数，避免触发 DeepSeek 的 RPM 限制
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # 主动限流，尽量不触发 429 再退避重试
+        self._bucket = TokenBucket(rpm, tpm)
+        # deepseek-chat 适合自然语言翻译；1.0 比 1.3 输出更稳定，减少重试
+        self.model = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+        self.temperature = 1.0
+        
+        # 译文缓存：进程内 LRU + 可选的本地磁盘缓存 + 可选的 MongoDB 持久化集合
+        self._memo = OrderedDict()
+        self.disk_cache = None
+        self.cache_collection = None
+
+    @classmethod
+    def _get_http_client(cls) -> httpx.AsyncClient:
+        if cls._http_client is None or cls._http_client.is_closed:
+            cls._http_client = httpx.AsyncClient(
+                http2=True,
+                timeout=60,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            )
+        return cls._http_client
+
+    async def aclose(self):
+        """Close the shared HTTP connection pool."""
+        await self.client.close()
 
-    def translate_text(self, text: str) -> str:
+    @retry(
+        retry=retry_if_exception_type(RateLimitError),
+        wait=wait_exponential_jitter(initial=1, max=30),
+        stop=stop_after_attempt(5),
+        reraise=True,
+    )
+    async def _create(self, messages: List[Dict], **kwargs) -> str:
+        """Rate-limited, streamed chat completion returning the message content; only 429 responses are retried."""
+        # 粗略按 4 字符 1 token 预估，返回后用实际用量修正
+        estimated = sum(len(m["content"]) for m in messages) // 4
+        await self._bucket.acquire(estimated)
+        
+        # 流式接收：长输出边生成边读取，读超时按分片计算而不是整个响应
+        parts = []
+        usage = None
+        async with self._semaphore:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                if chunk.usage:
+                    usage = chunk.usage
+        if usage:
+            self._bucket.adjust(estimated, usage.total_tokens)
+        return "".join(parts)
+
+    def enable_cache(self, collection):
+        """
+        Persist translations in a MongoDB collection keyed by sha1 of the source text.
+        
+        Args:
+            collection: pymongo collection used as translation cache; lookups and
+                writes run in a worker thread so they do not block the event loop
+        """
+        collection.create_index('h', unique=True)
+        self.cache_collection = collection
+
+    def enable_disk_cache(self, directory: str):
+        """
+        Persist translations in a local diskcache directory, checked before MongoDB.
+        
+        Args:
+            directory (str): Cache directory; ignored when diskcache is not installed
+        """
+        if diskcache is None:
+            logger.warning("diskcache not installed, local translation cache disabled")
+            return
+        self.disk_cache = diskcache.Cache(directory)
+
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    async def _cache_get_many(self, texts: List[str]) -> Dict[str, str]:
+        """返回 {原文: 译文}，依次查进程内缓存、本地磁盘缓存，再一次 $in 查询 MongoDB"""
+        found = {}
+        missing = {}
+        for text in texts:
+            if text in self._memo:
+                self._memo.move_to_end(text)
+                found[text] = self._memo[text]
+            else:
+                missing[self._text_hash(text)] = text
+        
+        if missing and (self.disk_cache is not None or self.cache_collection is not None):
+            # 磁盘缓存（SQLite + 文件）和 pymongo 都是同步 I/O，放到线程里执行，不阻塞事件循环
+            hits = await asyncio.to_thread(self._persistent_get_many, list(missing))
+            for h, translation in hits.items():
+                text = missing[h]
+                found[text] = translation
+                self._memoize(text, translation)
+        return found
+
+    def _persistent_get_many(self, hashes: List[str]) -> Dict[str, str]:
+        """在工作线程中查磁盘缓存，其余一次 $in 查询 MongoDB 并回填磁盘，返回 {哈希: 译文}"""
+        hits = {}
+        if self.disk_cache is not None:
+            for h in hashes:
+                translation = self.disk_cache.get(h)
+                if translation is not None:
+                    hits[h] = translation
+        
+        remaining = [h for h in hashes if h not in hits]
+        if remaining and self.cache_collection is not None:
+            for doc in self.cache_collection.find({'h': {'$in': remaining}}, {'h': 1, 't': 1}):
+                hits[doc['h']] = doc['t']
+                if self.disk_cache is not None:
+                    self.disk_cache.set(doc['h'], doc['t'])
+        return hits
+
+    async def _cache_put_many(self, pairs: Dict[str, str]):
+        """写入缓存，跳过翻译失败（译文与原文相同）的条目"""
+        pairs = {text: translation for text, translation in pairs.items() if translation and translation != text}
+        if not pairs:
+            return
+        for text, translation in pairs.items():
+            self._memoize(text, translation)
+        
+        if self.disk_cache is not None or self.cache_collection is not None:
+            await asyncio.to_thread(self._persistent_put_many, pairs)
+
+    def _persistent_put_many(self, pairs: Dict[str, str]):
+        """在工作线程中写入磁盘缓存和 MongoDB"""
+        hashes = {text: self._text_hash(text) for text in pairs}
+        if self.disk_cache is not None:
+            for text, translation in pairs.items():
+                self.disk_cache.set(hashes[text], translation)
+        
+        if self.cache_collection is not None:
+            try:
+                self.cache_collection.bulk_write([
+                    UpdateOne({'h': hashes[text]}, {'$setOnInsert': {'t': translation, 'src': text}}, upsert=True)
+                    for text, translation in pairs.items()
+                ], ordered=False)
+            except Exception as e:
+                logger.warning("Translation cache write error: %s", e)
+
+    def _memoize(self, text: str, translation: str):
+        self._memo[text] = translation
+        if len(self._memo) > self.MEMO_SIZE:
+            self._memo.popitem(last=False)
+
+    async def translate_text(self, text: str) -> str:
         """
         Translate a single text from Japanese to Chinese.
         
@@ -33,23 +263,26 @@ class DeepSeekTranslator:
         Returns:
             str: Translated Chinese text
         """
+        cached = await self._cache_get_many([text])
+        if text in cached:
+            return cached[text]
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                temperature=self.temperature,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that translates Japanese text to Chinese. Please translate the text accurately."},
-                    {"role": "user", "content": f"Translate the following text from Japanese to Chinese:\n{text}"}
-                ]
-            )
-            return response.choices[0].message.content.strip()
+            content = await self._create([
+                {"role": "system", "content": "You are a helpful assistant that translates Japanese text to Chinese. Please translate the text accurately."},
+                {"role": "user", "content": f"Translate the following text from Japanese to Chinese:\n{text}"}
+            ])
+            translation = content.strip()
         except Exception as e:
-            print(f"Translation error: {str(e)}")
+            logger.error("Translation error: %s", e)
             return text
+        
+        await self._cache_put_many({text: translation})
+        return translation
 
-    def batch_translate_texts(self, texts: List[str]) -> List[str]:
+    async def batch_translate_texts(self, texts: List[str]) -> List[str]:
         """
-        Translate multiple texts from Japanese to Chinese in a single API call.
+        Translate multiple texts from Japanese to Chinese, packed into token-bounded requests.
         
         Args:
             texts (List[str]): List of Japanese texts to translate
@@ -57,84 +290,72 @@ class DeepSeekTranslator:
         Returns:
             List[str]: List of translated Chinese texts
         """
+        # 已缓存的直接取，只把未缓存（去重后）的文本发给 API
+        cached = await self._cache_get_many(texts)
+        uncached = list(dict.fromkeys(text for text in texts if text not in cached))
+        if uncached:
+            # 按条数和字符数切块，各块并发请求，失败只重试出错的那一块
+            results = await asyncio.gather(*(self._translate_chunk(chunk) for chunk in self._chunk(uncached)))
+            translations = [t for chunk in results for t in chunk]
+            await self._cache_put_many(dict(zip(uncached, translations)))
+            cached.update(zip(uncached, translations))
+        else:
+            logger.debug("All %d texts served from translation cache", len(texts))
+        
+        return [cached[text] for text in texts]
+
+    def _chunk(self, texts: List[str]):
+        """Yield sublists of at most CHUNK_MAX_ITEMS texts / CHUNK_MAX_TOKENS estimated tokens."""
+        chunk = []
+        tokens = 0
+        for text in texts:
+            # 粗略按 4 字符 1 token 预估
+            text_tokens = len(text) // 4 + 1
+            if chunk and (len(chunk) >= self.CHUNK_MAX_ITEMS or tokens + text_tokens > self.CHUNK_MAX_TOKENS):
+                yield chunk
+                chunk = []
+                tokens = 0
+            chunk.append(text)
+            tokens += text_tokens
+        if chunk:
+            yield chunk
+
+    async def _translate_chunk(self, texts: List[str]) -> List[str]:
+        """Translate one chunk, retrying it on failure; returns the originals if all attempts fail."""
+        for attempt in range(self.CHUNK_RETRIES + 1):
+            try:
+                return await self._request_batch(texts)
+            except Exception as e:
+                logger.warning("Batch translation error (attempt %d): %s", attempt + 1, e)
+        return texts
+
+    async def _request_batch(self, texts: List[str]) -> List[str]:
+        """Translate texts in a single API call."""
+        logger.debug("Sending batch of %d texts for translation", len(texts))
+        
+        # 输入输出都用 JSON 数组，按下标一一对应，无需逐行解析编号
+        content = await self._create(
+            [
+                {"role": "system", "content": "You are a helpful assistant that translates Japanese text to Chinese. The user sends a JSON array of texts. Translate each text separately and return JSON {\"translations\": [...]} where translations[i] corresponds to input i (0-indexed)."},
+                {"role": "user", "content": json.dumps(texts, ensure_ascii=False)}
+            ],
+            response_format={"type": "json_object"},
+        )
+        
         try:
-            # Combine all texts into one prompt with numbering
-            combined_text = "\n---\n".join([f"{i+1}. {text}" for i, text in enumerate(texts)])
-            
-            print(f"\nSending batch of {len(texts)} texts for translation...")
-            print(f"Original texts:\n{combined_text}")
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                temperature=self.temperature,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that translates Japanese text to Chinese. Please translate each text separately and maintain the numbering. Return only the translations, one per line, with the same numbering format: '1. translation', '2. translation', etc."},
-                    {"role": "user", "content": f"Translate the following texts from Japanese to Chinese, keeping the same numbering format:\n{combined_text}"}
-                ]
-            )
-            
-            # Get the response content
-            response_text = response.choices[0].message.content.strip()
-            print(f"Translation response:\n{response_text}")
-            
-            # Split the response into individual translations
-            translations = []
-            lines = response_text.split('\n')
-            
-            # 使用更严格的解析逻辑
-            for line in lines:
-                line = line.strip()
-                
-                # Skip empty lines and separator lines
-                if not line or line == '---':
-                    continue
-                
-                # 只处理以数字开头的行
-                if line and line[0].isdigit():
-                    # 查找第一个点号的位置
-                    dot_index = line.find('. ')
-                    if dot_index > 0:
-                        # 提取数字部分
-                        number_part = line[:dot_index]
-                        if number_part.isdigit():
-                            # 提取翻译部分
-                            translation = line[dot_index + 2:].strip()
-                            if translation:  # 确保翻译不为空
-                                translations.append(translation)
-                            else:
-                                print(f"Warning: Empty translation for line: {line}")
-                        else:
-                            print(f"Warning: Invalid number format in line: {line}")
-                    else:
-                        print(f"Warning: No dot separator found in line: {line}")
-                else:
-                    print(f"Warning: Skipping non-numbered line: {line}")
-            
-            # 验证翻译数量
-            if len(translations) != len(texts):
-                print(f"Error: Got {len(translations)} translations for {len(texts)} texts")
-                print(f"Expected {len(texts)} translations, got {len(translations)}")
-                
-                # 如果翻译数量不匹配，尝试修复
-                if len(translations) > len(texts):
-                    # 如果翻译过多，截取前N个
-                    print(f"Truncating to first {len(texts)} translations")
-                    translations = translations[:len(texts)]
-                elif len(translations) < len(texts):
-                    # 如果翻译不足，用原文补充
-                    print(f"Padding with original texts for missing translations")
-                    while len(translations) < len(texts):
-                        missing_index = len(translations)
-                        translations.append(texts[missing_index])
-            
-            print(f"Final translations count: {len(translations)}")
-            return translations
-            
-        except Exception as e:
-            print(f"Batch translation error: {str(e)}")
-            return texts
+            translations = json.loads(content)["translations"]
+        except (ValueError, KeyError, TypeError):
+            # 模型偶尔不遵守 JSON 格式而返回编号列表
+            translations = _LINE_RE.findall(content)
+        
+        # 验证翻译数量
+        if len(translations) != len(texts):
+            raise ValueError(f"Got {len(translations)} translations for {len(texts)} texts")
+        
+        logger.debug("Final translations count: %d", len(translations))
+        return [str(t).strip() for t in translations]
 
-    def translate_document(self, doc: Dict, fields_to_translate: List[str]) -> Dict:
+    async def translate_document(self, doc: Dict, fields_to_translate: List[str]) -> Dict:
         """
         Translate specific fields in a document from Japanese to Chinese.
         
@@ -147,13 +368,14 @@ class DeepSeekTranslator:
         """
         translated_doc = doc.copy()
         
-        for field in fields_to_translate:
-            if field in doc and doc[field]:
-                translated_doc[f'{field}CN'] = self.translate_text(doc[field])
+        fields = [field for field in fields_to_translate if field in doc and doc[field]]
+        translations = await asyncio.gather(*(self.translate_text(doc[field]) for field in fields))
+        for field, translation in zip(fields, translations):
+            translated_doc[f'{field}CN'] = translation
         
         return translated_doc
 
-    def batch_translate_documents(self, docs: List[Dict], fields_to_translate: List[str]) -> List[Dict]:
+    async def batch_translate_documents(self, docs: List[Dict], fields_to_translate: List[str]) -> List[Dict]:
         """
         Translate specific fields in multiple documents from Japanese to Chinese.
         
@@ -164,9 +386,11 @@ class DeepSeekTranslator:
         Returns:
             List[Dict]: List of documents with translated fields
         """
-        translated_docs = []
+        # 每个文档只复制一次，译文按下标写回（文档缺字段时下标不连续）
+        translated_docs = [doc.copy() for doc in docs]
         
         # Prepare batches for each field
+        batches = {}
         for field in fields_to_translate:
             texts_to_translate = []
             doc_indices = []
@@ -178,24 +402,28 @@ class DeepSeekTranslator:
                     doc_indices.append(i)
             
             if texts_to_translate:
-                print(f"\nTranslating {len(texts_to_translate)} {field} fields...")
-                translations = self.batch_translate_texts(texts_to_translate)
-                
-                # Apply translations back to documents
-                for idx, translation in zip(doc_indices, translations):
-                    if idx >= len(translated_docs):
-                        translated_docs.append(docs[idx].copy())
-                    translated_docs[idx][f'{field}CN'] = translation
-        
-        # Verify translations
-        for doc in translated_docs:
-            translation_performed = False
-            for field in fields_to_translate:
-                if f'{field}CN' in doc and doc[f'{field}CN'] != doc[field]:
-                    translation_performed = True
-                    break
-            
-            if not translation_performed:
-                raise ValueError(f"No translation was performed for document {doc['_id']}")
+                batches[field] = (texts_to_translate, doc_indices)
+        
+        # 各字段的 API 调用互不依赖，并发发出，总耗时取决于最慢的字段
+        for field, (texts_to_translate, _) in batches.items():
+            logger.info("Translating %d %s fields", len(texts_to_translate), field)
+        results = await asyncio.gather(*(self.batch_translate_texts(texts) for texts, _ in batches.values()))
+        
+        # 写回时顺带记录：哪些文档有待翻译字段、哪些确实得到了不同于原文的译文
+        attempted = set()
+        translated = set()
+        for (field, (texts_to_translate, doc_indices)), translations in zip(batches.items(), results):
+            # Apply translations back to documents
+            for idx, text, translation in zip(doc_indices, texts_to_translate, translations):
+                translated_docs[idx][f'{field}CN'] = translation
+                attempted.add(idx)
+                if translation != text:
+                    translated.add(idx)
+        
+        # Verify translations（没有任何待翻译字段的文档不参与校验）
+        missing = attempted - translated
+        if missing:
+            ids = [docs[idx].get('_id') for idx in sorted(missing)]
+            raise ValueError(f"No translation was performed for documents {ids}")
         
         return translated_docs 
\ No newline at end of file